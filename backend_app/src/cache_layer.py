@@ -0,0 +1,623 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Backend used by @cached when none is given: "memory", "sqlite" or "redis"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+# Entries are pickled, so the SQLite file lives in a directory only this user can write
+CACHE_PATH = os.environ.get("CACHE_PATH") or os.path.join(
+    tempfile.gettempdir(), f"cache_layer-{os.getuid() if hasattr(os, 'getuid') else 'user'}", "cache.sqlite"
+)
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Upper bound on entries held by a backend across all cached functions
+DEFAULT_MAX_ENTRIES = 4096
+
+# Background workers for stale-while-revalidate refreshes, and seconds between warmer passes
+REFRESH_WORKERS = int(os.environ.get("CACHE_REFRESH_WORKERS", "4"))
+WARM_INTERVAL = float(os.environ.get("CACHE_WARM_INTERVAL", "300"))
+
+# Versions of underlying series are kept this long; a missing version just forces a recompute
+SERIES_VERSION_TTL = 30 * 86400
+SERIES_NAMESPACE = "series-version"
+
+# A cached value with the time it was computed, the time it stops being fresh, and the
+# versions of the underlying series it was computed from
+CacheEntry = namedtuple("CacheEntry", ["value", "created_at", "expires_at", "dependencies"], defaults=(None,))
+
+class MemoryBackend:
+    """
+    In-process LRU cache with TTL. Entries live until they expire or are evicted as
+    least recently used, per namespace and across the whole backend.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (entry, namespace, purge_at)
+        self._namespaces = {}  # namespace -> OrderedDict of keys, in LRU order
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None:
+                return None
+            entry, namespace, purge_at = stored
+            if purge_at <= time.time():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            self._namespaces[namespace].move_to_end(key)
+            return entry
+
+    def set(self, key, entry, namespace, keep_for, max_entries=None):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (entry, namespace, time.time() + keep_for)
+            keys = self._namespaces.setdefault(namespace, OrderedDict())
+            keys[key] = None
+            while max_entries and len(keys) > max_entries:
+                self._discard(next(iter(keys)))
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self, namespace=None):
+        with self._lock:
+            keys = list(self._entries) if namespace is None else list(self._namespaces.get(namespace, ()))
+            for key in keys:
+                self._discard(key)
+
+    def _discard(self, key):
+        stored = self._entries.pop(key, None)
+        if stored is not None:
+            self._namespaces[stored[1]].pop(key, None)
+
+class SQLiteBackend:
+    """
+    On-disk cache in a SQLite file, shared by every process on the host. Entries are
+    pickled; least recently used entries are evicted per namespace and overall.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key TEXT PRIMARY KEY, namespace TEXT, entry BLOB, purge_at REAL, accessed_at REAL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, accessed_at)")
+
+    def _connect(self):
+        # One connection per thread; WAL lets readers in other processes proceed during writes
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+                _check_private(directory)
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT entry FROM cache_entries WHERE key = ? AND purge_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, entry, namespace, keep_for, max_entries=None):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL), now + keep_for, now),
+            )
+            connection.execute("DELETE FROM cache_entries WHERE purge_at <= ?", (now,))
+            if max_entries:
+                connection.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key NOT IN ("
+                    " SELECT key FROM cache_entries WHERE namespace = ? ORDER BY accessed_at DESC LIMIT ?)",
+                    (namespace, namespace, max_entries),
+                )
+            connection.execute(
+                "DELETE FROM cache_entries WHERE key NOT IN ("
+                " SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def clear(self, namespace=None):
+        with self._connect() as connection:
+            if namespace is None:
+                connection.execute("DELETE FROM cache_entries")
+            else:
+                connection.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+def _check_private(directory):
+    """
+    Refuse a cache directory that other users could write to, since entries are unpickled.
+    """
+    if not hasattr(os, "getuid"):
+        return
+    status = os.stat(directory)
+    if status.st_uid not in (os.getuid(), 0) or status.st_mode & 0o022:
+        raise PermissionError(f"Cache directory {directory} must be owned by this user and not writable by others")
+
+class RedisBackend:
+    """
+    Cache in Redis (or anything speaking its commands), shared across hosts and lambdas.
+
+    Entries expire through Redis key TTLs. Per-namespace size bounds are kept with a
+    sorted set of keys by last access; the overall bound is Redis's own maxmemory policy.
+
+    Args:
+        client: A redis-py compatible client (e.g. redis.Redis or a local stand-in).
+        prefix (str): Prefix for every key written.
+    """
+
+    def __init__(self, client, prefix="cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=CACHE_REDIS_URL, prefix="cache:"):
+        import redis  # Optional dependency, only needed for this backend
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def _index(self, namespace):
+        return f"{self.prefix}index:{namespace}"
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        if data is None:
+            return None
+        namespace, entry = pickle.loads(data)
+        self.client.zadd(self._index(namespace), {key: time.time()})
+        return entry
+
+    def set(self, key, entry, namespace, keep_for, max_entries=None):
+        data = pickle.dumps((namespace, entry), protocol=pickle.HIGHEST_PROTOCOL)
+        self.client.set(self.prefix + key, data, px=max(int(keep_for * 1000), 1))
+        index = self._index(namespace)
+        self.client.zadd(index, {key: time.time()})
+        if max_entries:
+            excess = self.client.zcard(index) - max_entries
+            if excess > 0:
+                evicted = self.client.zrange(index, 0, excess - 1)
+                self.client.delete(*[self.prefix + _decode(evicted_key) for evicted_key in evicted])
+                self.client.zrem(index, *evicted)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self, namespace=None):
+        if namespace is None:
+            raise ValueError("RedisBackend only clears one namespace at a time")
+        index = self._index(namespace)
+        keys = self.client.zrange(index, 0, -1)
+        if keys:
+            self.client.delete(*[self.prefix + _decode(key) for key in keys])
+        self.client.delete(index)
+
+def _decode(key):
+    return key.decode() if isinstance(key, bytes) else key
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one: the first caller runs the
+    function, callers arriving while it runs wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, on_wait=None):
+        """
+        Run `fn` for `key` unless a call for the same key is already running.
+
+        Args:
+            key (str): Identity of the call.
+            fn (callable): Function to run, without arguments.
+            on_wait (callable, optional): Called when this caller joins a running call.
+
+        Returns:
+            The result of the (possibly shared) call.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if on_wait is not None:
+                on_wait()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+_in_flight = SingleFlight()
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+def get_default_backend():
+    """
+    Backend selected by the CACHE_BACKEND environment variable, created on first use.
+    """
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            if CACHE_BACKEND == "sqlite":
+                _default_backend = SQLiteBackend(CACHE_PATH)
+            elif CACHE_BACKEND == "redis":
+                _default_backend = RedisBackend.from_url(CACHE_REDIS_URL)
+            else:
+                _default_backend = MemoryBackend()
+        return _default_backend
+
+def set_default_backend(backend):
+    """
+    Replace the backend used by @cached functions that were not given one explicitly.
+    """
+    global _default_backend
+    with _default_backend_lock:
+        _default_backend = backend
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+def _key_part(value):
+    """
+    JSON-serializable stand-in for an argument, derived from its full contents.
+
+    Arrays and pandas objects are hashed rather than represented by their (truncated)
+    repr, and types without a content-based form are rejected instead of keyed by repr,
+    which may be truncated or contain a memory address.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return _key_part(value.item())
+    if isinstance(value, (list, tuple)):
+        return [_key_part(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {"set": sorted((_key_part(item) for item in value), key=json.dumps)}
+    if isinstance(value, dict):
+        items = [[_key_part(k), _key_part(v)] for k, v in value.items()]
+        return {"dict": sorted(items, key=lambda item: json.dumps(item[0]))}
+    if isinstance(value, (datetime, date)):
+        return {type(value).__name__: value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"timedelta": value.total_seconds()}
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return {"ndarray": [value.dtype.str, list(value.shape), _key_part(value.tolist())]}
+        return {"ndarray": [value.dtype.str, list(value.shape), _digest(np.ascontiguousarray(value).tobytes())]}
+    if isinstance(value, pd.DataFrame):
+        rows = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        return {"DataFrame": [
+            _key_part(value.columns.tolist()), [str(dtype) for dtype in value.dtypes], _digest(rows.tobytes()),
+        ]}
+    if isinstance(value, (pd.Series, pd.Index)):
+        rows = pd.util.hash_pandas_object(value, index=isinstance(value, pd.Series)).to_numpy()
+        return {type(value).__name__: [_key_part(value.name), str(value.dtype), _digest(rows.tobytes())]}
+    raise TypeError(f"Cannot build a cache key from an argument of type {type(value).__name__}")
+
+def make_key(namespace, arguments):
+    """
+    Stable key for a call, identical across processes for equal arguments.
+
+    Raises:
+        TypeError: If an argument has no content-based key (see _key_part).
+    """
+    payload = json.dumps(_key_part(arguments), sort_keys=True)
+    return f"{namespace}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+def series_version(name, backend=None):
+    """
+    Current version token of an underlying data series (e.g. 'equity:AAPL'), or None.
+    """
+    entry = (backend or get_default_backend()).get(f"{SERIES_NAMESPACE}:{name}")
+    return entry.value if entry is not None else None
+
+def invalidate_series(names, backend=None):
+    """
+    Mark data series as updated, so every cached result derived from them is recomputed.
+
+    Args:
+        names (iterable): Series names, as returned by the `depends_on` of @cached functions.
+        backend (optional): Backend holding the derived entries (default: get_default_backend()).
+    """
+    store = backend or get_default_backend()
+    now = time.time()
+    for name in names:
+        try:
+            entry = CacheEntry(uuid.uuid4().hex, now, now + SERIES_VERSION_TTL)
+            store.set(f"{SERIES_NAMESPACE}:{name}", entry, SERIES_NAMESPACE, SERIES_VERSION_TTL)
+        except Exception as e:
+            logger.warning(f"Could not invalidate series {name}: {e}")
+
+def _dependency_versions(store, names):
+    return {name: series_version(name, store) for name in names}
+
+def _changed_at(store, entry, depends_on, arguments):
+    """
+    When the series an entry was derived from were last updated, if any of them was
+    updated since the entry was computed (0 if that time is unknown), else None.
+    """
+    if depends_on is None:
+        return None
+    changed_at = None
+    recorded = entry.dependencies or {}
+    for name in depends_on(**arguments):
+        version = store.get(f"{SERIES_NAMESPACE}:{name}")
+        if recorded.get(name) != (version.value if version is not None else None):
+            updated_at = version.created_at if version is not None else 0
+            changed_at = updated_at if changed_at is None else max(changed_at, updated_at)
+    return changed_at
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_refresh_executor = None
+
+def _submit_refresh(key, task):
+    """
+    Run a background refresh for a key, unless one is already queued or running.
+    """
+    global _refresh_executor
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+
+    def run():
+        try:
+            task()
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    _refresh_executor.submit(run)
+
+def cached(ttl, max_entries=None, backend=None, namespace=None, depends_on=None, stale_grace=0, cache_if=None):
+    """
+    Cache a function's results in a pluggable backend.
+
+    Like st.cache_data, parameters whose names start with an underscore are left out of
+    the cache key, and exceptions are not cached. If the backend is unavailable the
+    function is simply called. Concurrent misses on the same key within a process are
+    coalesced into a single call whose result they all share.
+
+    With a `stale_grace`, a result that expired less than `stale_grace` seconds ago is
+    still returned immediately while it is recomputed in the background
+    (stale-while-revalidate). Likewise, a result whose series were invalidated less than
+    `stale_grace` seconds ago is still returned while it is recomputed in the background.
+
+    Args:
+        ttl (float or callable): Seconds a result stays fresh, or a callable returning them
+            when the result is stored (e.g. market_hours.session_ttl).
+        max_entries (int, optional): Most results kept for this function.
+        backend (optional): Backend instance (default: get_default_backend()).
+        namespace (str, optional): Key namespace (default: module.qualname of the function).
+        depends_on (callable, optional): Called with the function's arguments as keywords,
+            returns the names of the series a result is derived from. The result is
+            recomputed once any of them is passed to invalidate_series.
+        stale_grace (float): Seconds past expiry, or past an invalidation of its series,
+            during which a stale result is served.
+        cache_if (callable, optional): Called with a result and the function's arguments as
+            keywords; the result is only stored if it returns True, so failure sentinels
+            (None, {'error': ...}) are retried on the next call.
+
+    Returns:
+        callable: Decorator. The wrapped function gains `cache_clear()`,
+            `cache_key(*args, **kwargs)` and `warm(within, *args, **kwargs)`.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        func_namespace = namespace or f"{func.__module__}.{func.__qualname__}"
+
+        def bind(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return bound.arguments
+
+        def key_for(arguments):
+            return make_key(func_namespace, {
+                name: value for name, value in arguments.items() if not name.startswith("_")
+            })
+
+        def cache_key(*args, **kwargs):
+            return key_for(bind(*args, **kwargs))
+
+        def lookup(store, key, arguments):
+            """
+            Return (entry, fresh) for a key: the cached entry if it is fresh or within the
+            stale grace, and whether it is fresh; (None, False) if there is none to serve.
+            """
+            try:
+                entry = store.get(key)
+                if entry is None:
+                    return None, False
+                now = time.time()
+                changed_at = _changed_at(store, entry, depends_on, arguments)
+                if changed_at is None and entry.expires_at > now:
+                    return entry, True
+                if entry.expires_at + stale_grace > now and (changed_at is None or changed_at + stale_grace > now):
+                    return entry, False
+            except Exception as e:
+                logger.warning(f"Cache read failed for {func_namespace}: {e}")
+            return None, False
+
+        def compute(store, key, arguments, args, kwargs, force=False):
+            """
+            Call the function and store its result, unless another call stored a fresh one meanwhile.
+            """
+            if not force:
+                entry, fresh = lookup(store, key, arguments)
+                if fresh:
+                    return entry.value
+
+            _record(func_namespace, "misses")
+            value = func(*args, **kwargs)
+            if cache_if is not None and not cache_if(value, **arguments):
+                return value
+            now = time.time()
+            entry_ttl = ttl() if callable(ttl) else ttl
+            try:
+                # Versions after the call, which may itself have fetched newer bars
+                dependencies = None if depends_on is None else _dependency_versions(store, depends_on(**arguments))
+                entry = CacheEntry(value, now, now + entry_ttl, dependencies)
+                store.set(key, entry, func_namespace, entry_ttl + stale_grace, max_entries)
+            except Exception as e:
+                logger.warning(f"Cache write failed for {func_namespace}: {e}")
+            return value
+
+        def run_once(store, key, arguments, args, kwargs, force=False):
+            # Concurrent computations of the same key share one call
+            return _in_flight.do(
+                key,
+                lambda: compute(store, key, arguments, args, kwargs, force),
+                on_wait=lambda: _record(func_namespace, "coalesced"),
+            )
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            store = backend or get_default_backend()
+            arguments = bind(*args, **kwargs)
+            key = key_for(arguments)
+            entry, fresh = lookup(store, key, arguments)
+            if entry is not None:
+                if fresh:
+                    _record(func_namespace, "hits")
+                else:
+                    _record(func_namespace, "stale")
+                    _submit_refresh(key, lambda: run_once(store, key, arguments, args, kwargs))
+                return entry.value
+            return run_once(store, key, arguments, args, kwargs)
+
+        def warm(within, *args, **kwargs):
+            """
+            Recompute the result for these arguments if it is missing or expires within
+            `within` seconds. Returns True if it was recomputed.
+            """
+            store = backend or get_default_backend()
+            arguments = bind(*args, **kwargs)
+            key = key_for(arguments)
+            entry, fresh = lookup(store, key, arguments)
+            if fresh and entry.expires_at > time.time() + within:
+                return False
+            run_once(store, key, arguments, args, kwargs, force=True)
+            return True
+
+        wrapper.cache_key = cache_key
+        wrapper.cache_namespace = func_namespace
+        wrapper.cache_clear = lambda: (backend or get_default_backend()).clear(func_namespace)
+        wrapper.warm = warm
+        return wrapper
+    return decorator
+
+def start_warmer(jobs, interval=WARM_INTERVAL):
+    """
+    Keep popular results fresh by recomputing them on a schedule in a background thread.
+
+    Every `interval` seconds each job's result is recomputed if it is missing or would
+    expire before the next pass, so users of those arguments never wait on a refresh.
+
+    Args:
+        jobs (list): (cached function, args tuple) pairs, e.g. (safe_fetch_stock_price, ("AAPL",)).
+        interval (float): Seconds between passes.
+
+    Returns:
+        threading.Event: Set it to stop the warmer.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            for func, args in jobs:
+                if stop.is_set():
+                    break
+                try:
+                    if func.warm(interval, *args):
+                        _record(func.cache_namespace, "warmed")
+                except Exception as e:
+                    logger.warning(f"Warming {func.__qualname__}{args} failed: {e}")
+            stop.wait(interval)
+
+    threading.Thread(target=run, name="cache-warmer", daemon=True).start()
+    return stop
+
+_COUNTERS = ("hits", "misses", "coalesced", "stale", "warmed")
+_stats = {}
+_stats_lock = threading.Lock()
+
+def _record(namespace, counter):
+    with _stats_lock:
+        counters = _stats.setdefault(namespace, dict.fromkeys(_COUNTERS, 0))
+        counters[counter] += 1
+
+def cache_stats():
+    """
+    Call counts per cached function in this process: hits, misses (function calls),
+    coalesced (misses that waited for an identical call already in flight), stale
+    (expired or invalidated results served while refreshing in the background) and warmed (results
+    recomputed by the warmer).
+    """
+    with _stats_lock:
+        return {namespace: dict(counters) for namespace, counters in _stats.items()}
@@ -1,18 +1,64 @@
+import os
+import threading
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
 # Import custom modules
-from backend.src.crypto.app.lambda_function import get_crypto_stats
+from backend.src.cache_layer import WARM_INTERVAL, cached, invalidate_series, start_warmer
+from backend.src.market_hours import session_ttl
+from backend.src.crypto.app.lambda_function import (
+    lambda_handler as get_crypto_stats,
+    get_multi_crypto_stats,
+)
 from backend.src.stocks.stock_statistics.app.lambda_function import (
-    calculate_portfolio_metrics,
     calculate_correlation,
+    get_return_statistics,
+    normalize_portfolio,
+    normalize_tickers,
+    weight_portfolio,
 )
+# Imported by the same bare names the lambda modules above use, so the listeners are
+# registered on the stores they actually read through
+from crypto_history import add_update_listener as on_crypto_history_update
+from price_history import add_update_listener as on_price_history_update, get_latest_price
+
+# Results derived from a price series are invalidated as soon as that series gets new bars
+on_price_history_update(lambda tickers: invalidate_series([f"equity:{ticker}" for ticker in tickers]))
+on_crypto_history_update(lambda symbol, currency: invalidate_series([f"crypto:{symbol}"]))
+
+# Popular symbols kept fresh in the background, so their users never wait on a refresh
+WARM_TICKERS = os.environ.get("CACHE_WARM_TICKERS", "AAPL,MSFT,NVDA,AMZN,GOOGL,META,TSLA,SPY").split(",")
+WARM_CRYPTOS = os.environ.get("CACHE_WARM_CRYPTOS", "BTC,ETH,SOL,XRP,DOGE").split(",")
+
+# Expired results are served for this long while they are refreshed in the background
+PRICE_STALE_GRACE = 300
+STATS_STALE_GRACE = 1800
+
+def is_result(value, **_):
+    """
+    Whether a wrapped call produced a real result rather than a failure sentinel
+    (None, NaN or an {'error': ...} dict), which must not be cached.
+    """
+    if value is None:
+        return False
+    if isinstance(value, float):
+        return not np.isnan(value)
+    if isinstance(value, dict):
+        return "error" not in value
+    return True
+
+def equity_series(tickers):
+    return [f"equity:{ticker.upper()}" for ticker in tickers]
+
+def crypto_series(symbols):
+    return [f"crypto:{symbol.upper()}" for symbol in symbols]
 
 # Caching Strategy for Expensive Computations
-@st.cache_data(ttl=3600)  # Cache results for 1 hour
+# Equity TTLs apply while the market trades and stretch to the next open while it is closed
+@cached(ttl=session_ttl("equity", 3600), max_entries=256, stale_grace=STATS_STALE_GRACE,
+        depends_on=lambda ticker, **_: equity_series([ticker]), cache_if=is_result)
 def cached_fetch_volatility(_fetch_function, ticker, period):
     """
     Cached wrapper for volatility fetching
@@ -27,7 +73,8 @@ def cached_fetch_volatility(_fetch_function, ticker, period):
     """
     return _fetch_function(ticker, period)
 
-@st.cache_data(ttl=86400)  # Cache crypto stats for 24 hours
+@cached(ttl=session_ttl("crypto", 3600), max_entries=256, stale_grace=STATS_STALE_GRACE,
+        depends_on=lambda symbol, **_: crypto_series([symbol]), cache_if=is_result)
 def cached_get_crypto_stats(symbol, period):
 
     """
@@ -36,7 +83,6 @@ def cached_get_crypto_stats(symbol, period):
     Args:
         symbol (str): Cryptocurrency symbol
         period (int): Time period in days
-        @st.cache_data(ttl=86400)  # Cache for 24 hours
     
     Returns:
         dict: Cryptocurrency statistics
@@ -44,7 +90,7 @@ def cached_get_crypto_stats(symbol, period):
     print(f"Cache Miss - Fetching data for {symbol} with period {period}")
     return get_crypto_stats(symbol, period)
 
-@st.cache_data(ttl=3600)
+@cached(ttl=session_ttl("equity", 300), max_entries=512, stale_grace=PRICE_STALE_GRACE, cache_if=is_result)
 def safe_fetch_stock_price(ticker):
     """
     Safely fetch current stock price with caching
@@ -56,16 +102,39 @@ def safe_fetch_stock_price(ticker):
         float or None: Current stock price or None if error
     """
     try:
-        stock = yf.Ticker(ticker.upper())
-        return stock.history(period="1d")["Close"].iloc[-1]
+        # Read through the price-history store, so new bars invalidate derived results
+        return get_latest_price(ticker)
     except Exception as e:
         st.error(f"Error fetching price for {ticker}: {e}")
         return None
 
-@st.cache_data(ttl=3600)
+@cached(ttl=session_ttl("equity", 3600), max_entries=128, stale_grace=STATS_STALE_GRACE,
+        depends_on=lambda tickers, **_: equity_series(tickers))
+def cached_market_statistics(tickers, period="1y"):
+    """
+    Cached market-data stage of the portfolio pipeline: downloads and return statistics
+    (returns, volatilities, correlation and covariance) for a ticker set
+    
+    Args:
+        tickers (tuple): Normalized ticker set, from normalize_tickers
+        period (str): Time period for analysis
+    
+    Returns:
+        dict: Return statistics as computed by get_return_statistics
+    """
+    return get_return_statistics(list(tickers), period, use_cache=False)
+
+def market_statistics(tickers, period="1y"):
+    """
+    Return statistics for any spelling or order of a ticker set, through the cached stage
+    """
+    return cached_market_statistics(normalize_tickers(tickers), period)
+
 def cached_portfolio_metrics(portfolio_tuples, period="1y", risk_free_rate=0.05):
     """
-    Cached wrapper for portfolio metrics calculation
+    Portfolio metrics from the cached market-data stage. Only the cheap weighting is
+    recomputed per request, so holdings that differ in order, ticker case, share counts
+    or prices share one download and covariance
     
     Args:
         portfolio_tuples (list): List of tuples with (stock_ticker, number_of_shares, current_price)
@@ -76,15 +145,18 @@ def cached_portfolio_metrics(portfolio_tuples, period="1y", risk_free_rate=0.05)
         dict: Portfolio metrics including risk, return, and stock details
     """
     try:
-        return calculate_portfolio_metrics(portfolio_tuples, period, risk_free_rate)
+        if not portfolio_tuples:
+            raise ValueError("Portfolio cannot be empty")
+        holdings = normalize_portfolio(portfolio_tuples)
+        statistics = market_statistics([ticker for ticker, _, _ in holdings], period)
+        return weight_portfolio(holdings, statistics, risk_free_rate)
     except Exception as e:
         st.error(f"Error calculating portfolio metrics: {e}")
         return None
 
-@st.cache_data(ttl=3600)
 def cached_correlation_matrix(tickers, period="1y"):
     """
-    Cached wrapper for correlation matrix calculation
+    Correlation matrix from the cached market-data stage, in the caller's ticker order
     
     Args:
         tickers (list): List of stock tickers
@@ -94,7 +166,7 @@ def cached_correlation_matrix(tickers, period="1y"):
         pd.DataFrame: Correlation matrix
     """
     try:
-        return calculate_correlation(tickers, period)
+        return calculate_correlation(tickers, period, statistics=market_statistics(tickers, period))
     except Exception as e:
         st.error(f"Error calculating correlation matrix: {e}")
         return None
@@ -135,10 +207,12 @@ def initialize_session_state():
     if "alerts" not in st.session_state:
         st.session_state.alerts = []
 
-@st.cache_data(ttl=3600)
+    # Keep popular tickers and cryptocurrencies fresh for every session
+    start_cache_warmer()
+
 def get_portfolio_performance_metrics(portfolio_tuples, period="1y"):
     """
-    Cached wrapper for getting comprehensive portfolio performance metrics
+    Comprehensive portfolio performance metrics, built on the cached market-data stage
     
     Args:
         portfolio_tuples (list): List of tuples with (stock_ticker, number_of_shares, current_price)
@@ -170,7 +244,9 @@ def get_portfolio_performance_metrics(portfolio_tuples, period="1y"):
         st.error(f"Error calculating portfolio performance metrics: {e}")
         return None
 
-@st.cache_data(ttl=3600)
+@cached(ttl=session_ttl("crypto", 3600), max_entries=64, stale_grace=STATS_STALE_GRACE,
+        depends_on=lambda symbols, **_: crypto_series(symbols),
+        cache_if=lambda data, symbols, **_: data is not None and all(symbol in data for symbol in symbols))
 def get_crypto_market_data(symbols, period=365):
     """
     Cached wrapper for getting multiple cryptocurrency statistics
@@ -183,12 +259,39 @@ def get_crypto_market_data(symbols, period=365):
         dict: Dictionary of cryptocurrency statistics
     """
     try:
-        crypto_data = {}
-        for symbol in symbols:
-            stats = cached_get_crypto_stats(symbol, period)
-            if 'error' not in stats:
-                crypto_data[symbol] = stats
-        return crypto_data
+        # Histories are fetched concurrently and the statistics computed in one pass
+        stats = get_multi_crypto_stats(symbols, period)
+        return {
+            symbol: stats[symbol.upper()]
+            for symbol in symbols
+            if 'error' not in stats.get(symbol.upper(), {'error': None})
+        }
     except Exception as e:
         st.error(f"Error fetching cryptocurrency market data: {e}")
-        return None
\ No newline at end of file
+        return None
+
+_warmer_lock = threading.Lock()
+_warmer = None
+
+def start_cache_warmer(tickers=None, cryptos=None, period=365, interval=WARM_INTERVAL):
+    """
+    Start refreshing the warm list of popular tickers and cryptocurrencies in the
+    background (once per process; later calls are no-ops).
+
+    Args:
+        tickers (list, optional): Stock tickers whose prices are kept fresh (default WARM_TICKERS).
+        cryptos (list, optional): Cryptocurrencies whose statistics are kept fresh (default WARM_CRYPTOS).
+        period (int): Crypto statistics period in days.
+        interval (float): Seconds between refresh passes.
+    """
+    global _warmer
+    tickers = WARM_TICKERS if tickers is None else tickers
+    cryptos = WARM_CRYPTOS if cryptos is None else cryptos
+    with _warmer_lock:
+        if _warmer is not None:
+            return
+        jobs = [(safe_fetch_stock_price, (ticker,)) for ticker in tickers]
+        jobs += [(cached_get_crypto_stats, (symbol, period)) for symbol in cryptos]
+        if cryptos:
+            jobs.append((get_crypto_market_data, (list(cryptos), period)))
+        _warmer = start_warmer(jobs, interval)
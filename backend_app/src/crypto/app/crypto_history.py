@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cryptocompare
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# Per-symbol daily bars, one Parquet file per symbol, plus an in-process copy.
+# /tmp is the only writable path inside Lambda and survives warm invocations.
+STORE_DIR = os.environ.get("CRYPTO_HISTORY_DIR", "/tmp/crypto_history")
+
+# Seconds after which the latest (still forming) daily bar is refetched
+REFRESH_INTERVAL = 900
+
+_METADATA_KEY = b"crypto_history"
+_memory_cache = {}  # (symbol, currency) -> (DataFrame, metadata)
+_update_listeners = []
+
+# One lock per (symbol, currency), so threads never fetch or rewrite the same bars concurrently
+_symbol_locks = {}
+_symbol_locks_guard = threading.Lock()
+
+def _symbol_lock(symbol, currency):
+    with _symbol_locks_guard:
+        return _symbol_locks.setdefault((symbol, currency), threading.Lock())
+
+def add_update_listener(callback):
+    """
+    Register `callback(symbol, currency)`, called when a symbol's stored bars changed after a fetch.
+    """
+    _update_listeners.append(callback)
+
+def _cache_path(symbol, currency):
+    return os.path.join(STORE_DIR, f"{symbol}-{currency}.parquet")
+
+def _read_cache(symbol, currency):
+    """
+    Read a symbol's cached bars and metadata from memory or disk, or (None, None).
+    """
+    key = (symbol, currency)
+    if key in _memory_cache:
+        return _memory_cache[key]
+
+    path = _cache_path(symbol, currency)
+    if not os.path.exists(path):
+        return None, None
+    try:
+        table = pq.read_table(path)
+        cached = table.to_pandas(), json.loads(table.schema.metadata[_METADATA_KEY])
+    except Exception as e:
+        logger.warning(f"Discarding unreadable crypto history for {symbol}: {e}")
+        return None, None
+    _memory_cache[key] = cached
+    return cached
+
+def _write_cache(symbol, currency, df, meta):
+    """
+    Keep bars in memory and atomically persist them to disk.
+    """
+    _memory_cache[(symbol, currency)] = (df, meta)
+    try:
+        os.makedirs(STORE_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(df)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_METADATA_KEY] = json.dumps(meta).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, _cache_path(symbol, currency))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except Exception as e:
+        logger.warning(f"Could not persist crypto history for {symbol}: {e}")
+
+def _fetch_bars(symbol, currency, limit, to_ts):
+    """
+    Fetch up to `limit` + 1 daily bars ending at `to_ts`, indexed by bar time.
+    """
+    raw_data = cryptocompare.get_historical_price_day(symbol, currency=currency, limit=limit, toTs=to_ts)
+    df = pd.DataFrame(raw_data or [])
+    if df.empty or "time" not in df:
+        return pd.DataFrame()
+    df["time"] = pd.to_datetime(df["time"], unit="s", errors="coerce")
+    return df.dropna(subset=["time"]).set_index("time")
+
+def get_daily_history(symbol, period=365, currency="USD", max_age=REFRESH_INTERVAL):
+    """
+    Get the last `period` + 1 daily bars for a symbol, fetching only bars newer than the cache.
+
+    The full period is fetched only when the cache does not reach back far enough; in
+    steady state only the latest bar is refetched, at most once per `max_age` seconds.
+
+    Args:
+        symbol (str): Cryptocurrency ticker symbol (e.g. 'BTC').
+        period (int): Number of days of history.
+        currency (str): Quote currency.
+        max_age (float): Seconds before the latest cached bar is refetched.
+
+    Returns:
+        pd.DataFrame: Daily bars indexed by time (empty if nothing could be fetched).
+    """
+    symbol = symbol.upper()
+    with _symbol_lock(symbol, currency):
+        df, updated = _read_through(symbol, period, currency, max_age)
+
+    if updated:
+        for callback in _update_listeners:
+            try:
+                callback(symbol, currency)
+            except Exception as e:
+                logger.warning(f"Crypto history update listener failed: {e}")
+
+    if df is None or df.empty:
+        return pd.DataFrame()
+    return df.iloc[-(period + 1):].copy()
+
+def _read_through(symbol, period, currency, max_age):
+    """
+    Serve a symbol's bars from the cache, fetching missing or stale bars. Callers must
+    hold the symbol's lock.
+
+    A fetch that returns nothing leaves the cache as it was, so the next call retries
+    instead of serving an empty or outdated frame as fresh.
+
+    Returns:
+        tuple: (cached bars or None, whether the stored bars changed)
+    """
+    now = datetime.now()
+    today = pd.Timestamp(now).normalize()
+    start = today - pd.Timedelta(days=period)
+
+    df, meta = _read_cache(symbol, currency)
+    if df is None or pd.Timestamp(meta["covered_start"]) > start:
+        # Nothing cached for this range: fetch the whole period
+        fetched = _fetch_bars(symbol, currency, period, int(now.timestamp()))
+        covered_start = start if meta is None else min(start, pd.Timestamp(meta["covered_start"]))
+    elif time.time() - meta["fetched_at"] > max_age:
+        # Refetch the last cached bar (it may have been partial) and anything newer
+        days_missing = (today - df.index[-1].normalize()).days if len(df) else period
+        fetched = _fetch_bars(symbol, currency, max(days_missing, 1), int(now.timestamp()))
+        covered_start = pd.Timestamp(meta["covered_start"])
+    else:
+        return df, False
+
+    if fetched.empty:
+        return df, False
+
+    previous = df
+    df = fetched if df is None or df.empty else pd.concat([df, fetched])
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    meta = {"covered_start": covered_start.strftime("%Y-%m-%d"), "fetched_at": time.time()}
+    _write_cache(symbol, currency, df, meta)
+    return df, previous is None or not df.equals(previous)
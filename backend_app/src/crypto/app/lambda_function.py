@@ -1,7 +1,11 @@
-import cryptocompare
-import pandas as pd
 import numpy as np
-from datetime import datetime
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from crypto_history import get_daily_history
+
+# Upper bound on concurrent history fetches for multi-symbol requests
+MAX_FETCH_WORKERS = 8
 #1
 def lambda_handler(selected_crypto_symbol, period=365):
     """
@@ -15,23 +19,13 @@ def lambda_handler(selected_crypto_symbol, period=365):
         dict: Cryptocurrency statistics or error message.
     """
     try:
-        # Fetch historical data for the selected crypto from CryptoCompare
-        raw_data = cryptocompare.get_historical_price_day(
-            selected_crypto_symbol,  # Ticker symbol (e.g., 'BTC')
-            currency='USD',
-            limit=period,  # Fetch `period` days of data
-            toTs=int(datetime.now().timestamp())
-        )
-
-        # Convert the raw data to a DataFrame for easier handling
-        df = pd.DataFrame(raw_data)
-
-        # Convert 'time' to datetime and set it as the index
-        df['time'] = pd.to_datetime(df['time'], unit='s', errors='coerce')
-        df.set_index('time', inplace=True)
+        # Daily bars from the local history cache; only bars newer than the cache are fetched
+        df = get_daily_history(selected_crypto_symbol, period=period, currency='USD')
+        if df.empty:
+            return {"error": "Not enough data to calculate statistics"}
 
         # Drop any rows with missing data
-        df.dropna(subset=['close'], inplace=True)
+        df = df.dropna(subset=['close'])
 
         # Ensure the DataFrame has enough data to calculate statistics
         if len(df) < 2:
@@ -61,3 +55,101 @@ def lambda_handler(selected_crypto_symbol, period=365):
 
     except Exception as e:
         return {"error": f"Error fetching data for {selected_crypto_symbol}: {str(e)}"}
+
+def fetch_close_matrix(symbols, period=365, max_workers=MAX_FETCH_WORKERS):
+    """
+    Fetch daily closes for many symbols concurrently and align them on one time index.
+
+    Args:
+        symbols (list): Cryptocurrency ticker symbols.
+        period (int): Number of days for historical data.
+        max_workers (int): Maximum number of concurrent fetches.
+
+    Returns:
+        tuple: (pd.DataFrame of closes, time by symbol, with NaN where a symbol has no bar;
+            dict of symbol -> error message for symbols that could not be fetched)
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    closes, errors = {}, {}
+    if not symbols:
+        return pd.DataFrame(), errors
+
+    def fetch(symbol):
+        try:
+            return symbol, get_daily_history(symbol, period=period, currency='USD'), None
+        except Exception as e:
+            return symbol, None, f"Error fetching data for {symbol}: {str(e)}"
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as executor:
+        for symbol, df, error in executor.map(fetch, symbols):
+            if error:
+                errors[symbol] = error
+            elif df.empty or 'close' not in df:
+                errors[symbol] = "Not enough data to calculate statistics"
+            else:
+                closes[symbol] = df['close']
+
+    close = pd.DataFrame(closes).sort_index() if closes else pd.DataFrame()
+    return close.reindex(columns=[symbol for symbol in symbols if symbol in closes]), errors
+
+def calculate_crypto_stats(close):
+    """
+    Calculate price change, period return and volatility for every column at once.
+
+    Each column is treated like the single-symbol statistics: missing bars are skipped,
+    so returns run from one available close to the next.
+
+    Args:
+        close (pd.DataFrame): Daily closes, time by symbol.
+
+    Returns:
+        pd.DataFrame: One row per symbol with current_price, price_change_24h,
+            annual_return and volatility (percent); NaN where fewer than 2 closes exist.
+    """
+    values = close.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    # Closes counted from the start and from the end of each column
+    from_start = np.cumsum(valid, axis=0)
+    from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+    start_price = (filled * (valid & (from_start == 1))).sum(axis=0)
+    current_price = (filled * (valid & (from_end == 1))).sum(axis=0)
+    previous_price = (filled * (valid & (from_end == 2))).sum(axis=0)
+    enough_data = valid.sum(axis=0) >= 2
+
+    log_returns = np.log(close / close.ffill().shift(1))
+    volatility = log_returns.std().to_numpy() * (252 ** 0.5)  # Annualized volatility (252 trading days)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats = pd.DataFrame({
+            "current_price": current_price,
+            "price_change_24h": (current_price - previous_price) / previous_price * 100,
+            "annual_return": (current_price - start_price) / start_price * 100,
+            "volatility": volatility * 100  # Convert to percentage
+        }, index=close.columns)
+    return stats.where(pd.Series(enough_data, index=close.columns), axis=0)
+
+def get_multi_crypto_stats(symbols, period=365, max_workers=MAX_FETCH_WORKERS):
+    """
+    Fetch statistics for many cryptocurrencies in one pass.
+
+    Args:
+        symbols (list): Cryptocurrency ticker symbols.
+        period (int): Number of days for historical data.
+        max_workers (int): Maximum number of concurrent fetches.
+
+    Returns:
+        dict: Symbol -> statistics dict (same keys as lambda_handler) or error message.
+    """
+    close, errors = fetch_close_matrix(symbols, period, max_workers)
+    results = {symbol: {"error": error} for symbol, error in errors.items()}
+    if close.empty:
+        return results
+
+    for symbol, row in calculate_crypto_stats(close).iterrows():
+        if np.isnan(row["current_price"]):
+            results[symbol] = {"error": "Not enough data to calculate statistics"}
+        else:
+            results[symbol] = {key: float(value) for key, value in row.items()}
+    return results
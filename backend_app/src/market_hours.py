@@ -0,0 +1,139 @@
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+# Regular US equity session (NYSE/Nasdaq), in exchange time
+EQUITY_TIMEZONE = ZoneInfo("America/New_York")
+EQUITY_OPEN = time(9, 30)
+EQUITY_CLOSE = time(16, 0)
+
+# Quotes keep settling for a while after the close (delayed feeds, closing auction)
+CLOSE_SETTLE = timedelta(minutes=30)
+
+# Shortest TTL handed out, so entries expiring right at a session boundary are still useful
+MIN_TTL = 60
+
+def _observed(day):
+    """
+    Weekday on which a fixed-date holiday is observed (Saturday -> Friday, Sunday -> Monday).
+    """
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def _nth_weekday(year, month, weekday, n):
+    """
+    n-th given weekday (0 = Monday) of a month; n = -1 for the last one.
+    """
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year):
+    """
+    Gregorian Easter Sunday (anonymous Gregorian algorithm).
+    """
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def equity_holidays(year):
+    """
+    Full-day NYSE holidays of a year.
+    """
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    # New Year's Day falling on a Saturday is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in equity_holidays(day.year)
+
+def _now(now):
+    return (now or datetime.now(EQUITY_TIMEZONE)).astimezone(EQUITY_TIMEZONE)
+
+def is_market_open(market="equity", now=None):
+    """
+    Whether a market is in its regular session.
+
+    Args:
+        market (str): 'equity' or 'crypto' (always open).
+        now (datetime, optional): Timezone-aware time to check (default: now).
+    """
+    if market == "crypto":
+        return True
+    now = _now(now)
+    return is_trading_day(now.date()) and EQUITY_OPEN <= now.time() < EQUITY_CLOSE
+
+def next_session_open(now=None):
+    """
+    Start of the next regular equity session after `now` (or today's, if not yet open).
+    """
+    now = _now(now)
+    day = now.date()
+    if now.time() >= EQUITY_OPEN:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return datetime.combine(day, EQUITY_OPEN, tzinfo=EQUITY_TIMEZONE)
+
+def session_close(now=None):
+    """
+    End of the current regular equity session.
+    """
+    now = _now(now)
+    return datetime.combine(now.date(), EQUITY_CLOSE, tzinfo=EQUITY_TIMEZONE)
+
+def market_ttl(market="equity", open_ttl=900, now=None):
+    """
+    Seconds a cached market value stays fresh.
+
+    While the market trades, and for a short settling period after the close, values live
+    for `open_ttl` but never past the session's end, so the closing prices are picked up
+    promptly. While it is closed nothing changes, so values live until the next session
+    opens. Crypto trades around the clock and always gets `open_ttl`.
+
+    Args:
+        market (str): 'equity' or 'crypto'.
+        open_ttl (float): TTL while the market is open.
+        now (datetime, optional): Timezone-aware current time (default: now).
+
+    Returns:
+        float: TTL in seconds.
+    """
+    if market == "crypto":
+        return open_ttl
+    now = _now(now)
+    settled = session_close(now) + CLOSE_SETTLE
+    if is_trading_day(now.date()) and EQUITY_OPEN <= now.time() and now < settled:
+        return max(min(open_ttl, (settled - now).total_seconds()), MIN_TTL)
+    return max((next_session_open(now) - now).total_seconds(), MIN_TTL)
+
+def session_ttl(market="equity", open_ttl=900):
+    """
+    TTL policy for @cached: a callable returning market_ttl(market, open_ttl) at store time.
+    """
+    return lambda: market_ttl(market, open_ttl)
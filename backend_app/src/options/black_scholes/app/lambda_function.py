@@ -1,17 +1,184 @@
-import math
-from scipy.stats import norm
+import numpy as np
+from scipy.special import ndtr
+
+def _option_flags(option_type, shape):
+    """
+    Convert an option type (or array of option types) into a boolean call mask.
+
+    Args:
+        option_type (str or array-like): 'call'/'put' or an array of them.
+        shape (tuple): Broadcast shape of the pricing inputs.
+
+    Returns:
+        np.ndarray: Boolean array, True where the contract is a call.
+    """
+    types = np.char.lower(np.asarray(option_type, dtype=str))
+    is_call = types == "call"
+    if not np.all(is_call | (types == "put")):
+        raise ValueError("Invalid option type. Use 'call' or 'put'.")
+    return np.broadcast_to(is_call, shape)
+
+def _black_scholes_terms(S, K, T, r, sigma, option_type):
+    """
+    Broadcast the pricing inputs and compute the intermediates shared by price and Greeks.
+
+    Returns:
+        dict: Broadcast inputs plus sign (+1 call / -1 put), sqrt_T, d1, d2 and discounted_K.
+    """
+    S, K, T, r, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma)))
+    sign = np.where(_option_flags(option_type, S.shape), 1.0, -1.0)
+
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    return {
+        "S": S, "K": K, "T": T, "r": r, "sigma": sigma, "sign": sign,
+        "sqrt_T": sqrt_T, "d1": d1, "d2": d2, "discounted_K": K * np.exp(-r * T),
+    }
+
+def black_scholes_batch(S, K, T, r, sigma, option_type="call"):
+    """
+    Price an array of European options with the Black-Scholes formula in one vectorized pass.
+
+    All inputs are broadcast against each other, so a chain can be priced by passing
+    e.g. a scalar spot with arrays of strikes and expiries.
+
+    Args:
+        S (float or array-like): Spot price(s) of the underlying.
+        K (float or array-like): Strike price(s).
+        T (float or array-like): Time(s) to expiry in years.
+        r (float or array-like): Risk-free rate(s).
+        sigma (float or array-like): Volatility(ies).
+        option_type (str or array-like): 'call', 'put' or an array of them.
+
+    Returns:
+        np.ndarray: Option prices with the broadcast shape of the inputs.
+    """
+    t = _black_scholes_terms(S, K, T, r, sigma, option_type)
+    sign = t["sign"]
+
+    # Evaluate the put as the call with negated d-terms and flipped sign: one cdf call per term
+    return sign * (t["S"] * ndtr(sign * t["d1"]) - t["discounted_K"] * ndtr(sign * t["d2"]))
+
+def black_scholes_greeks(S, K, T, r, sigma, option_type="call"):
+    """
+    Compute the price and Greeks of an array of European options in one vectorized pass.
+
+    d1/d2, the normal pdf and the cdf terms are evaluated once and shared by every output.
+    Sensitivities are per unit change of the input: vega and volga per 1.00 of volatility,
+    rho per 1.00 of rate, theta and charm per year.
+
+    Args:
+        S (float or array-like): Spot price(s) of the underlying.
+        K (float or array-like): Strike price(s).
+        T (float or array-like): Time(s) to expiry in years.
+        r (float or array-like): Risk-free rate(s).
+        sigma (float or array-like): Volatility(ies).
+        option_type (str or array-like): 'call', 'put' or an array of them.
+
+    Returns:
+        dict: Arrays for price, delta, gamma, vega, theta, rho, vanna, volga and charm.
+    """
+    t = _black_scholes_terms(S, K, T, r, sigma, option_type)
+    S, T, r, sigma, sign = t["S"], t["T"], t["r"], t["sigma"], t["sign"]
+    sqrt_T, d1, d2, discounted_K = t["sqrt_T"], t["d1"], t["d2"], t["discounted_K"]
+
+    pdf_d1 = np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi)
+    cdf_d1 = ndtr(sign * d1)
+    cdf_d2 = ndtr(sign * d2)
+    sigma_sqrt_T = sigma * sqrt_T
+
+    price = sign * (S * cdf_d1 - discounted_K * cdf_d2)
+    vega = S * pdf_d1 * sqrt_T
+
+    return {
+        "price": price,
+        "delta": sign * cdf_d1,
+        "gamma": pdf_d1 / (S * sigma_sqrt_T),
+        "vega": vega,
+        "theta": -S * pdf_d1 * sigma / (2 * sqrt_T) - sign * r * discounted_K * cdf_d2,
+        "rho": sign * T * discounted_K * cdf_d2,
+        "vanna": -pdf_d1 * d2 / sigma,
+        "volga": vega * d1 * d2 / sigma,
+        "charm": -pdf_d1 * (2 * r * T - d2 * sigma_sqrt_T) / (2 * T * sigma_sqrt_T),
+    }
+
+def implied_volatility_batch(price, S, K, T, r, option_type="call", tol=1e-8, max_iter=100,
+                             sigma_bounds=(1e-6, 5.0)):
+    """
+    Solve for the Black-Scholes implied volatility of an array of option prices at once.
+
+    Each iteration takes a Newton step using vega for every unconverged contract and
+    maintains a per-contract [low, high] bracket; whenever a Newton step leaves the
+    bracket (or vega vanishes) the contract falls back to bisection, so every contract
+    with an attainable price converges.
+
+    Args:
+        price (float or array-like): Observed option price(s).
+        S (float or array-like): Spot price(s) of the underlying.
+        K (float or array-like): Strike price(s).
+        T (float or array-like): Time(s) to expiry in years.
+        r (float or array-like): Risk-free rate(s).
+        option_type (str or array-like): 'call', 'put' or an array of them.
+        tol (float): Absolute price tolerance for convergence.
+        max_iter (int): Maximum number of iterations.
+        sigma_bounds (tuple): Initial (low, high) volatility bracket.
+
+    Returns:
+        dict: Arrays of implied_volatility (NaN where unsolved), converged flags,
+            per-contract iterations and the final absolute price residual.
+    """
+    price, S, K, T, r = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (price, S, K, T, r)))
+    sign = np.where(_option_flags(option_type, S.shape), 1.0, -1.0)
+    sqrt_T = np.sqrt(T)
+    discounted_K = K * np.exp(-r * T)
+
+    # Prices outside the no-arbitrage bounds have no implied volatility
+    lower_bound = np.maximum(sign * (S - discounted_K), 0.0)
+    upper_bound = np.where(sign > 0, S, discounted_K)
+    solvable = (price > lower_bound) & (price < upper_bound)
+
+    low = np.full(S.shape, sigma_bounds[0])
+    high = np.full(S.shape, sigma_bounds[1])
+    # Brenner-Subrahmanyam approximation as the starting point
+    sigma = np.clip(np.sqrt(2 * np.pi / T) * price / S, low, high)
+    iterations = np.zeros(S.shape, dtype=int)
+    residual = np.full(S.shape, np.inf)
+    converged = np.zeros(S.shape, dtype=bool)
+    active = solvable.copy()
+
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+        d2 = d1 - sigma * sqrt_T
+        diff = sign * (S * ndtr(sign * d1) - discounted_K * ndtr(sign * d2)) - price
+        vega = S * np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi) * sqrt_T
+        residual = np.where(active, np.abs(diff), residual)
+        iterations += active
+
+        done = active & (residual < tol)
+        converged |= done
+        active &= ~done
+
+        # Price is increasing in sigma, so the sign of the error tightens the bracket
+        high = np.where(active & (diff > 0), sigma, high)
+        low = np.where(active & (diff < 0), sigma, low)
+
+        with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+            newton = sigma - diff / vega
+        use_newton = np.isfinite(newton) & (newton > low) & (newton < high)
+        sigma = np.where(active, np.where(use_newton, newton, 0.5 * (low + high)), sigma)
+
+    return {
+        "implied_volatility": np.where(converged, sigma, np.nan),
+        "converged": converged,
+        "iterations": iterations,
+        "residual": np.where(solvable, residual, np.nan),
+    }
 
 def lambda_handler(S, K, T, r, sigma, option_type="call"):
     """
     Calculate the price of a European option using the Black-Scholes formula.
     """
-    d1 = (math.log(S / K) + (r + (sigma ** 2) / 2) * T) / (sigma * math.sqrt(T))
-    d2 = d1 - sigma * math.sqrt(T)
-
-    if option_type.lower() == "call":
-        price = S * norm.cdf(d1) - K * math.exp(-r * T) * norm.cdf(d2)
-    elif option_type.lower() == "put":
-        price = K * math.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    else:
-        raise ValueError("Invalid option type. Use 'call' or 'put'.")
-    return price
+    return float(black_scholes_batch(S, K, T, r, sigma, option_type))
@@ -1,89 +1,168 @@
+import base64
 import numpy as np
 import plotly.graph_objects as go
 import math
-from scipy.stats import norm
+from scipy.special import ndtr
 
-def black_scholes(S, K, T, r, sigma, option_type="call"):
+# Grids larger than this are rendered without per-cell price annotations
+ANNOTATION_CELL_LIMIT = 400
+
+def black_scholes_surfaces(stock_prices, volatilities, K, T, r):
     """
-    Calculate the price of a European option using the Black-Scholes formula.
+    Compute call and put price surfaces over a grid of spot prices and volatilities.
+
+    The grid is evaluated with a single broadcast; d1/d2 are shared by both surfaces
+    and the put surface is derived from the call surface through put-call parity.
+
+    Args:
+        stock_prices (array-like): Spot prices (grid rows).
+        volatilities (array-like): Volatilities (grid columns).
+        K (float): Strike price.
+        T (float): Time to expiry in years.
+        r (float): Risk-free rate.
+
+    Returns:
+        tuple: (call_surface, put_surface), each of shape (len(stock_prices), len(volatilities)).
     """
-    d1 = (math.log(S / K) + (r + (sigma ** 2) / 2) * T) / (sigma * math.sqrt(T))
-    d2 = d1 - sigma * math.sqrt(T)
-
-    if option_type.lower() == "call":
-        price = S * norm.cdf(d1) - K * math.exp(-r * T) * norm.cdf(d2)
-    elif option_type.lower() == "put":
-        price = K * math.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    else:
-        raise ValueError("Invalid option type. Use 'call' or 'put'.")
-    return price
-
-def lambda_handler(S, K, T, r, min_S, max_S, min_sigma, max_sigma):
-        # Generate heatmap data
-    stock_prices = np.linspace(min_S, max_S, 10)
-    volatilities = np.linspace(min_sigma, max_sigma, 10)
-
-    call_heatmap_data = np.zeros((10, 10))
-    put_heatmap_data = np.zeros((10, 10))
-
-    for i, S_val in enumerate(stock_prices):
-        for j, sigma_val in enumerate(volatilities):
-            call_heatmap_data[i, j] = black_scholes(S_val, K, T, r, sigma_val, "call")
-            put_heatmap_data[i, j] = black_scholes(S_val, K, T, r, sigma_val, "put")
-
-    # Create the Plotly heatmap for Call options
-    call_heatmap_fig = go.Figure(data=go.Heatmap(
-        z=call_heatmap_data,
-        x=[f"σ={sigma:.2f}" for sigma in volatilities],
-        y=[f"S={S:.2f}" for S in stock_prices],
-        colorscale='RdYlGn',
-        colorbar=dict(title="Call Option Price"),
-        hoverongaps=False,
-        hovertemplate='Stock Price: %{y}<br>Volatility: %{x}<br>Price: $%{z:.2f}'  # Hover template with price display
-    ))
+    S_grid, sigma_grid = np.meshgrid(stock_prices, volatilities, indexing="ij")
+    sqrt_T = math.sqrt(T)
+    discounted_K = K * math.exp(-r * T)
+
+    d1 = (np.log(S_grid / K) + (r + 0.5 * sigma_grid ** 2) * T) / (sigma_grid * sqrt_T)
+    d2 = d1 - sigma_grid * sqrt_T
+
+    call_surface = S_grid * ndtr(d1) - discounted_K * ndtr(d2)
+    put_surface = call_surface - S_grid + discounted_K
+    return call_surface, put_surface
 
-    # Create the Plotly heatmap for Put options
-    put_heatmap_fig = go.Figure(data=go.Heatmap(
-        z=put_heatmap_data,
-        x=[f"σ={sigma:.2f}" for sigma in volatilities],
-        y=[f"S={S:.2f}" for S in stock_prices],
+def encode_surface(surface, output="json"):
+    """
+    Encode a price surface compactly.
+
+    Args:
+        surface (np.ndarray): 2D price surface.
+        output (str): 'json' for nested lists rounded to float32 precision (7 significant
+            digits), 'binary' for base64-encoded little-endian float32 bytes (row-major).
+
+    Returns:
+        list or str: Encoded surface.
+    """
+    surface = np.asarray(surface, dtype="<f4")
+    if output == "json":
+        # Round to 7 significant digits in one vectorized pass
+        values = surface.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            magnitude = np.floor(np.log10(np.abs(values)))
+        scale = 10.0 ** (6 - np.where(np.isfinite(magnitude), magnitude, 0))
+        return (np.round(values * scale) / scale).tolist()
+    if output == "binary":
+        return base64.b64encode(surface.tobytes()).decode("ascii")
+    raise ValueError("Invalid output format. Use 'figure', 'json' or 'binary'.")
+
+def build_heatmap_figure(surface, stock_prices, volatilities, option_label, annotate=True):
+    """
+    Build a Plotly heatmap figure for a price surface.
+
+    Args:
+        surface (np.ndarray): 2D price surface (rows are spot prices, columns volatilities).
+        stock_prices (np.ndarray): Spot price axis.
+        volatilities (np.ndarray): Volatility axis.
+        option_label (str): 'Call' or 'Put', used in titles.
+        annotate (bool): Whether to print the price in each cell.
+
+    Returns:
+        go.Figure: The heatmap figure.
+    """
+    x_labels = [f"σ={sigma:.2f}" for sigma in volatilities]
+    y_labels = [f"S={S:.2f}" for S in stock_prices]
+
+    fig = go.Figure(data=go.Heatmap(
+        z=surface,
+        x=x_labels,
+        y=y_labels,
         colorscale='RdYlGn',
-        colorbar=dict(title="Put Option Price"),
+        colorbar=dict(title=f"{option_label} Option Price"),
         hoverongaps=False,
         hovertemplate='Stock Price: %{y}<br>Volatility: %{x}<br>Price: $%{z:.2f}'  # Hover template with price display
     ))
 
-    # Add annotations to the heatmap cells for the option prices
-    for i in range(len(stock_prices)):
-        for j in range(len(volatilities)):
-            call_heatmap_fig.add_annotation(
-                x=f"σ={volatilities[j]:.2f}",
-                y=f"S={stock_prices[i]:.2f}",
-                text=f"${call_heatmap_data[i, j]:.2f}",
-                showarrow=False,
-                font=dict(size=12, color="black")
-            )
-            put_heatmap_fig.add_annotation(
-                x=f"σ={volatilities[j]:.2f}",
-                y=f"S={stock_prices[i]:.2f}",
-                text=f"${put_heatmap_data[i, j]:.2f}",
+    # Set all cell annotations in one layout update rather than one add_annotation call per cell
+    annotations = []
+    if annotate:
+        annotations = [
+            dict(
+                x=x_labels[j],
+                y=y_labels[i],
+                text=f"${surface[i, j]:.2f}",
                 showarrow=False,
                 font=dict(size=12, color="black")
             )
+            for i in range(len(y_labels))
+            for j in range(len(x_labels))
+        ]
 
-    # Update layout for both heatmaps
-    call_heatmap_fig.update_layout(
-        title="Call Option Price Heatmap",
+    fig.update_layout(
+        title=f"{option_label} Option Price Heatmap",
         xaxis_title="Volatility (σ)",
         yaxis_title="Stock Price (S)",
-        height=500
+        height=500,
+        annotations=annotations
     )
+    return fig
 
-    put_heatmap_fig.update_layout(
-        title="Put Option Price Heatmap",
-        xaxis_title="Volatility (σ)",
-        yaxis_title="Stock Price (S)",
-        height=500
-    )
+def _grid_shape(resolution):
+    """
+    Normalize a heatmap resolution into (spot points, volatility points).
+    """
+    if np.isscalar(resolution):
+        resolution = (resolution, resolution)
+    n_S, n_sigma = (int(n) for n in resolution)
+    if n_S < 2 or n_sigma < 2:
+        raise ValueError("Heatmap resolution must be at least 2 points per axis.")
+    return n_S, n_sigma
+
+def lambda_handler(S, K, T, r, min_S, max_S, min_sigma, max_sigma, resolution=10, output="figure", annotate=None):
+    """
+    Build call and put price heatmaps over a spot/volatility grid.
+
+    Args:
+        S (float): Current spot price (unused by the grid, kept for API compatibility).
+        K (float): Strike price.
+        T (float): Time to expiry in years.
+        r (float): Risk-free rate.
+        min_S, max_S (float): Spot price range.
+        min_sigma, max_sigma (float): Volatility range.
+        resolution (int or tuple): Grid points per axis, or (spot points, volatility points).
+        output (str): 'figure' for Plotly figures, 'json' for surfaces as nested lists,
+            or 'binary' for base64-encoded float32 surfaces (see encode_surface).
+        annotate (bool or None): Print prices in each cell of the figures. Defaults to
+            annotating only grids of at most ANNOTATION_CELL_LIMIT cells.
+
+    Returns:
+        dict: Plotly figures for the call and put heatmaps, or the raw surfaces with
+            their axis vectors when output is 'json' or 'binary'.
+    """
+    # Generate heatmap data
+    n_S, n_sigma = _grid_shape(resolution)
+    stock_prices = np.linspace(min_S, max_S, n_S)
+    volatilities = np.linspace(min_sigma, max_sigma, n_sigma)
+
+    call_heatmap_data, put_heatmap_data = black_scholes_surfaces(stock_prices, volatilities, K, T, r)
+
+    if output != "figure":
+        return {
+            "shape": [n_S, n_sigma],
+            "encoding": output,
+            "stock_prices": stock_prices.tolist(),
+            "volatilities": volatilities.tolist(),
+            "call": encode_surface(call_heatmap_data, output),
+            "put": encode_surface(put_heatmap_data, output),
+        }
+
+    if annotate is None:
+        annotate = n_S * n_sigma <= ANNOTATION_CELL_LIMIT
+
+    call_heatmap_fig = build_heatmap_figure(call_heatmap_data, stock_prices, volatilities, "Call", annotate)
+    put_heatmap_fig = build_heatmap_figure(put_heatmap_data, stock_prices, volatilities, "Put", annotate)
 
     return {"call": call_heatmap_fig, "put": put_heatmap_fig}
@@ -0,0 +1,58 @@
+from lambda_function import alert_key, content_alert_id, table
+
+def scan_active_alerts():
+    """
+    Yield every active alert in the table, following scan pagination.
+    """
+    kwargs = {
+        "FilterExpression": "alert_status = :active",
+        "ExpressionAttributeValues": {":active": "active"},
+    }
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get("Items", [])
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+def compact_duplicate_alerts():
+    """
+    Merge active alerts that share (email, symbol, price_point, comparison_mode).
+
+    Each group is rewritten as a single alert under its content-derived id, keeping the earliest created_at, and the other copies are deleted. Single
+    alerts created before ids were deterministic are migrated the same way, so later
+    re-submits are recognised as duplicates. Alerts created with an idempotency key are
+    merged the same way; a client retrying with that key finds the merged alert, because
+    key-based creates also check the content id.
+
+    Returns:
+        dict: Number of groups merged and alerts deleted.
+    """
+    groups = {}
+    for alert in scan_active_alerts():
+        groups.setdefault(alert_key(alert), []).append(alert)
+
+    merged = deleted = 0
+    with table.batch_writer() as batch:
+        for alerts in groups.values():
+            canonical_id = content_alert_id(alerts[0])
+            if len(alerts) == 1 and alerts[0]["alert_id"] == canonical_id:
+                continue
+
+            keeper = min(alerts, key=lambda alert: alert.get("created_at", ""))
+            batch.put_item(Item={**keeper, "alert_id": canonical_id})
+            for alert in alerts:
+                if alert["alert_id"] != canonical_id:
+                    batch.delete_item(Key={"alert_id": alert["alert_id"]})
+                    deleted += 1
+            merged += len(alerts) > 1
+
+    print(f"Merged {merged} duplicate alert groups, removed {deleted} redundant alerts.")
+    return {"merged_groups": merged, "deleted_alerts": deleted}
+
+def lambda_handler(event, context):
+    """
+    Entry point for the scheduled compaction job.
+    """
+    return {"statusCode": 200, "body": compact_duplicate_alerts()}
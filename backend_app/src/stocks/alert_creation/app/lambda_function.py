@@ -1,42 +1,258 @@
 import json
+import time
 import boto3
-from uuid import uuid4
+from botocore.exceptions import ClientError
+from decimal import Decimal
+from uuid import UUID, uuid5
 from datetime import datetime
 
 dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table("StockAlerts")
+table_name = "StockAlerts"
+table = dynamodb.Table(table_name)
+
+BATCH_WRITE_LIMIT = 25  # Items per BatchWriteItem request
+BATCH_GET_LIMIT = 100  # Keys per BatchGetItem request
+MAX_BATCH_RETRIES = 5
+
+# Namespace for deterministic alert ids, so the same alert always maps to the same key
+ALERT_ID_NAMESPACE = UUID("6f1c2a8e-3b5d-4c7a-9e0f-2d4b6a8c0e1f")
+
+# Only overwrite an existing alert with the same id if it is no longer active
+NOT_ACTIVE_CONDITION = {
+    "ConditionExpression": "attribute_not_exists(alert_id) OR alert_status <> :active",
+    "ExpressionAttributeValues": {":active": "active"},
+}
+
+def validate_alert(data):
+    """
+    Check a single alert request.
+
+    Returns:
+        str or None: Error message, or None if the alert is valid.
+    """
+    if not isinstance(data, dict):
+        return "Alert must be an object."
+    email = data.get("email")
+    stock_symbol = data.get("stock_symbol")
+    price_point = data.get("price_point")
+    comparison_mode = data.get("comparison_mode")  # 1 for "greater than", 0 for "less than"
+    if not email or not isinstance(stock_symbol, str) or not stock_symbol or price_point is None \
+            or comparison_mode not in [0, 1]:
+        return "Invalid input data."
+    return None
+
+def alert_key(data):
+    """
+    Canonical identity of an alert: (email, symbol, price_point, comparison_mode).
+    """
+    price_point = format(Decimal(str(data["price_point"])).normalize(), "f")
+    return f"{data['email'].strip().lower()}|{data['stock_symbol'].strip().upper()}|{price_point}|{data['comparison_mode']}"
+
+def content_alert_id(data):
+    """
+    Deterministic alert id from the alert's canonical identity.
+    """
+    return str(uuid5(ALERT_ID_NAMESPACE, f"alert:{alert_key(data)}"))
+
+def alert_id_for(data):
+    """
+    Deterministic alert id from the client's idempotency key (scoped to the user's email),
+    or else from the alert's canonical identity, so retries and double-submits address the
+    same item.
+
+    Key-based creates also check the content id (see content_duplicate_ids), and compaction
+    merges key-based alerts under it, so a retry finds its alert after compaction too.
+    """
+    idempotency_key = data.get("idempotency_key")
+    if not idempotency_key:
+        return content_alert_id(data)
+    return str(uuid5(ALERT_ID_NAMESPACE, f"token:{data['email'].strip().lower()}|{idempotency_key}"))
+
+def build_alert_item(data):
+    """
+    Build the DynamoDB item for a validated alert request.
+    """
+    return {
+        "alert_id": alert_id_for(data),
+        "email": data["email"],
+        "stock_symbol": data["stock_symbol"].upper(),
+        "price_point": data["price_point"],
+        "comparison_mode": data["comparison_mode"],
+        "alert_status": "active",
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+def batch_put_items(items):
+    """
+    Write items with BatchWriteItem in chunks of 25, retrying unprocessed items with backoff.
+
+    Returns:
+        set: alert_ids of items that could not be written.
+    """
+    failed = set()
+    for start in range(0, len(items), BATCH_WRITE_LIMIT):
+        requests = [{"PutRequest": {"Item": item}} for item in items[start:start + BATCH_WRITE_LIMIT]]
+        for attempt in range(MAX_BATCH_RETRIES + 1):
+            try:
+                response = dynamodb.batch_write_item(RequestItems={table_name: requests})
+            except Exception as e:
+                print(f"Error writing alert batch: {e}")
+                break
+            requests = response.get("UnprocessedItems", {}).get(table_name, [])
+            if not requests:
+                break
+            if attempt < MAX_BATCH_RETRIES:
+                time.sleep(0.05 * 2 ** attempt)
+        failed.update(request["PutRequest"]["Item"]["alert_id"] for request in requests)
+    return failed
+
+def fetch_active_alert_ids(alert_ids):
+    """
+    Check which of the given alert ids already exist as active alerts, using BatchGetItem.
+
+    Returns:
+        tuple: (set of active alert_ids, set of alert_ids that could not be checked)
+    """
+    alert_ids = list(alert_ids)
+    active = set()
+    unchecked = set()
+    for start in range(0, len(alert_ids), BATCH_GET_LIMIT):
+        request = {table_name: {
+            "Keys": [{"alert_id": alert_id} for alert_id in alert_ids[start:start + BATCH_GET_LIMIT]],
+            "ProjectionExpression": "alert_id, alert_status",
+        }}
+        for attempt in range(MAX_BATCH_RETRIES + 1):
+            try:
+                response = dynamodb.batch_get_item(RequestItems=request)
+            except Exception as e:
+                print(f"Error reading alert batch: {e}")
+                break
+            active.update(
+                item["alert_id"] for item in response.get("Responses", {}).get(table_name, [])
+                if item.get("alert_status") == "active"
+            )
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            if attempt < MAX_BATCH_RETRIES:
+                time.sleep(0.05 * 2 ** attempt)
+        if request:
+            unchecked.update(key["alert_id"] for key in request[table_name]["Keys"])
+    return active, unchecked
+
+def create_alerts(alerts):
+    """
+    Validate and store many alerts at once.
+
+    Args:
+        alerts (list): Alert requests with email, stock_symbol, price_point and comparison_mode.
+
+    Returns:
+        list: Per-item results in request order, each with 'index', 'status' ('created',
+            'duplicate', 'invalid' or 'failed') and either 'alert_id' or 'message'.
+    """
+    results = []
+    items = {}
+    content_ids = {}  # alert_id -> content id, for alerts created with an idempotency key
+    first_ids = {}  # alert_key -> alert_id of its first occurrence in the request
+    for index, data in enumerate(alerts):
+        error = validate_alert(data)
+        if error:
+            results.append({"index": index, "status": "invalid", "message": error})
+            continue
+        # Repeats within the request, with or without keys, collapse onto the first occurrence
+        alert_id = first_ids.setdefault(alert_key(data), alert_id_for(data))
+        if alert_id in items:
+            results.append({"index": index, "status": "duplicate", "alert_id": alert_id})
+            continue
+        items[alert_id] = build_alert_item(data)
+        if data.get("idempotency_key"):
+            content_ids[alert_id] = content_alert_id(data)
+        results.append({"index": index, "status": "created", "alert_id": alert_id})
+
+    # Alerts that are already active, under their own or their content id, are left untouched.
+    # Alerts that could not be checked are not written, since the batch write would
+    # overwrite an active one.
+    existing, unchecked = fetch_active_alert_ids(set(items) | set(content_ids.values()))
+    skipped = set()
+    for result in results:
+        alert_id = result.get("alert_id")
+        content_id = content_ids.get(alert_id)
+        if alert_id in existing or content_id in existing:
+            result["status"] = "duplicate"
+            result["alert_id"] = alert_id if alert_id in existing else content_id
+        elif alert_id in unchecked or content_id in unchecked:
+            result["status"] = "failed"
+            result["message"] = "Could not check for an existing alert."
+        else:
+            continue
+        skipped.add(alert_id)
+    items = [item for alert_id, item in items.items() if alert_id not in skipped]
+
+    failed = batch_put_items(items)
+    for result in results:
+        if result.get("alert_id") in failed:
+            result["status"] = "failed"
+            result["message"] = "Could not store alert."
+    return results
+
+def bulk_lambda_handler(event, context):
+    body = json.loads(event["body"], parse_float=Decimal)  # DynamoDB rejects floats
+    alerts = body.get("alerts") if isinstance(body, dict) else None
+    if not isinstance(alerts, list) or not alerts:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"message": "Expected a non-empty list of alerts."})
+        }
+
+    results = create_alerts(alerts)
+    all_created = all(result["status"] in ("created", "duplicate") for result in results)
+    return {
+        "statusCode": 201 if all_created else 207,
+        "body": json.dumps({"results": results})
+    }
 
 def lambda_handler(event, context):
-    body = json.loads(event["body"])
-    email = body["email"]
-    stock_symbol = body["stock_symbol"]
-    price_point = body["price_point"]
-    comparison_mode = body["comparison_mode"]  # 1 for "greater than", 0 for "less than"
-    
+    body = json.loads(event["body"], parse_float=Decimal)  # DynamoDB rejects floats
+    if isinstance(body, dict) and "alerts" in body:
+        return bulk_lambda_handler(event, context)
+
     # Validate input
-    if not email or not stock_symbol or price_point is None or comparison_mode not in [0, 1]:
+    if validate_alert(body):
         return {
             "statusCode": 400,
             "body": json.dumps({"message": "Invalid input data."})
         }
-    
-    alert_id = str(uuid4())
-    created_at = datetime.utcnow().isoformat()
-
-    # Store alert in DynamoDB
-    table.put_item(
-        Item={
-            "alert_id": alert_id,
-            "email": email,
-            "stock_symbol": stock_symbol.upper(),
-            "price_point": price_point,
-            "comparison_mode": comparison_mode,
-            "alert_status": "active",
-            "created_at": created_at,
+
+    # Accept the idempotency key as a header as well as in the body
+    headers = {name.lower(): value for name, value in (event.get("headers") or {}).items()}
+    if not body.get("idempotency_key") and headers.get("idempotency-key"):
+        body["idempotency_key"] = headers["idempotency-key"]
+
+    item = build_alert_item(body)
+
+    # A key-based create is a duplicate of the same alert already active under its content id
+    if body.get("idempotency_key"):
+        content_id = content_alert_id(body)
+        existing = table.get_item(Key={"alert_id": content_id}, ProjectionExpression="alert_status").get("Item")
+        if existing and existing.get("alert_status") == "active":
+            return {
+                "statusCode": 200,
+                "body": json.dumps({"message": "Alert already exists.", "alert_id": content_id})
+            }
+
+    # Store alert in DynamoDB, unless the same alert is already active
+    try:
+        table.put_item(Item=item, **NOT_ACTIVE_CONDITION)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return {
+            "statusCode": 200,
+            "body": json.dumps({"message": "Alert already exists.", "alert_id": item["alert_id"]})
         }
-    )
 
     return {
         "statusCode": 201,
-        "body": json.dumps({"message": "Alert created successfully.", "alert_id": alert_id})
+        "body": json.dumps({"message": "Alert created successfully.", "alert_id": item["alert_id"]})
     }
@@ -0,0 +1,158 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+# comparison_mode values for "greater than" / "less than" alerts. The trigger historically
+# used ">" / "<", alert creation stores 1 / 0.
+GREATER_THAN_MODES = (">", 1)
+LESS_THAN_MODES = ("<", 0)
+
+class _SortedThresholds:
+    """
+    Alerts of one symbol and direction, kept sorted by price_point.
+    """
+
+    def __init__(self):
+        self.thresholds = []
+        self.alerts = []
+
+    def add(self, threshold, alert):
+        index = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(index, threshold)
+        self.alerts.insert(index, alert)
+
+    def extend(self, entries):
+        """
+        Add many (threshold, alert) pairs with one sort instead of repeated inserts.
+        """
+        merged = sorted(list(zip(self.thresholds, self.alerts)) + list(entries), key=lambda entry: entry[0])
+        self.thresholds = [threshold for threshold, _ in merged]
+        self.alerts = [alert for _, alert in merged]
+
+    def remove(self, threshold, alert_id):
+        start = bisect_left(self.thresholds, threshold)
+        end = bisect_right(self.thresholds, threshold)
+        for index in range(start, end):
+            if self.alerts[index]["alert_id"] == alert_id:
+                del self.thresholds[index]
+                del self.alerts[index]
+                return True
+        return False
+
+    def pop_prefix(self, end):
+        crossed = self.alerts[:end]
+        del self.thresholds[:end]
+        del self.alerts[:end]
+        return crossed
+
+    def pop_suffix(self, start):
+        crossed = self.alerts[start:]
+        del self.thresholds[start:]
+        del self.alerts[start:]
+        return crossed
+
+    def __len__(self):
+        return len(self.thresholds)
+
+class AlertBook:
+    """
+    In-memory book of active alerts indexed by symbol.
+
+    Per symbol, "greater than" and "less than" thresholds are kept in sorted arrays, so
+    every alert crossed by a new price is found with a single bisect per direction
+    instead of a scan over all alerts.
+    """
+
+    def __init__(self, alerts=()):
+        self._greater = {}
+        self._less = {}
+        self._index = {}  # alert_id -> (symbol, direction book, threshold)
+        self.add_many(alerts)
+
+    def _locate(self, alert):
+        """
+        Return (symbol, direction book, threshold) for an alert, or None if its mode is unknown.
+        """
+        symbol = alert["stock_symbol"].upper()
+        comparison_mode = alert["comparison_mode"]
+        if comparison_mode in GREATER_THAN_MODES:
+            books = self._greater
+        elif comparison_mode in LESS_THAN_MODES:
+            books = self._less
+        else:
+            print(f"Skipping alert {alert.get('alert_id')} with unknown comparison mode {comparison_mode!r}")
+            return None
+        return symbol, books.setdefault(symbol, _SortedThresholds()), Decimal(alert["price_point"])
+
+    def add(self, alert):
+        """
+        Add (or replace) a single alert.
+        """
+        self.remove(alert["alert_id"])
+        located = self._locate(alert)
+        if located is None:
+            return
+        symbol, book, threshold = located
+        book.add(threshold, alert)
+        self._index[alert["alert_id"]] = located
+
+    def add_many(self, alerts):
+        """
+        Add a batch of alerts, sorting each affected symbol's thresholds once.
+        """
+        pending = {}
+        # Keep only the last copy of an alert repeated within the batch
+        for alert in {alert["alert_id"]: alert for alert in alerts}.values():
+            self.remove(alert["alert_id"])
+            located = self._locate(alert)
+            if located is None:
+                continue
+            symbol, book, threshold = located
+            pending.setdefault(id(book), (book, []))[1].append((threshold, alert))
+            self._index[alert["alert_id"]] = located
+        for book, entries in pending.values():
+            book.extend(entries)
+
+    def remove(self, alert_id):
+        """
+        Remove an alert by id. Returns True if it was in the book.
+        """
+        located = self._index.pop(alert_id, None)
+        if located is None:
+            return False
+        _, book, threshold = located
+        return book.remove(threshold, alert_id)
+
+    def pop_crossed(self, symbol, price):
+        """
+        Remove and return every alert on `symbol` whose threshold `price` has reached:
+        "greater than" alerts with price >= threshold and "less than" alerts with price <= threshold.
+        """
+        symbol = symbol.upper()
+        price = Decimal(str(price))
+        crossed = []
+
+        greater = self._greater.get(symbol)
+        if greater:
+            crossed += greater.pop_prefix(bisect_right(greater.thresholds, price))
+        less = self._less.get(symbol)
+        if less:
+            crossed += less.pop_suffix(bisect_left(less.thresholds, price))
+
+        for alert in crossed:
+            self._index.pop(alert["alert_id"], None)
+        return crossed
+
+    def symbols(self):
+        """
+        Symbols with at least one alert in the book.
+        """
+        return [
+            symbol for symbol in set(self._greater) | set(self._less)
+            if len(self._greater.get(symbol, ())) or len(self._less.get(symbol, ()))
+        ]
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, alert_id):
+        return alert_id in self._index
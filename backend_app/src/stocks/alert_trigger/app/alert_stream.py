@@ -0,0 +1,140 @@
+import argparse
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from alert_book import AlertBook
+from lambda_function import dispatch_triggered_alerts, iter_active_alert_pages
+
+# Seconds between re-reads of the active alerts from the table
+SYNC_INTERVAL = 60
+
+def parse_tick(line):
+    """
+    Parse a price tick from either 'SYMBOL,PRICE' or a JSON object with symbol and price.
+
+    Returns:
+        tuple or None: (upper-cased symbol, price), or None for blank or malformed lines.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        if line.startswith("{"):
+            tick = json.loads(line)
+            return tick["symbol"].upper(), float(tick["price"])
+        symbol, price = line.split(",")[:2]
+        return symbol.strip().upper(), float(price)
+    except (ValueError, KeyError, AttributeError):
+        print(f"Skipping malformed tick: {line!r}")
+        return None
+
+def file_tick_source(path, follow=False, poll_interval=0.5):
+    """
+    Replay price ticks from a file, one tick per line.
+
+    Args:
+        path (str): File of ticks.
+        follow (bool): Keep waiting for appended lines, like `tail -f`.
+        poll_interval (float): Seconds between checks for new lines when following.
+
+    Yields:
+        tuple: (symbol, price)
+    """
+    with open(path) as ticks:
+        while True:
+            line = ticks.readline()
+            if not line:
+                if not follow:
+                    return
+                time.sleep(poll_interval)
+                continue
+            tick = parse_tick(line)
+            if tick:
+                yield tick
+
+def socket_tick_source(host, port):
+    """
+    Read newline-delimited price ticks from a TCP socket until it closes.
+
+    Yields:
+        tuple: (symbol, price)
+    """
+    with socket.create_connection((host, port)) as connection:
+        for line in connection.makefile("r"):
+            tick = parse_tick(line)
+            if tick:
+                yield tick
+
+def load_alert_book():
+    """
+    Build an alert book from every active alert in the table.
+    """
+    book = AlertBook()
+    for alerts in iter_active_alert_pages():
+        book.add_many(alerts)
+    return book
+
+def run_stream(tick_source, sync_interval=SYNC_INTERVAL):
+    """
+    Evaluate alerts incrementally as price ticks arrive.
+
+    Active alerts are held in memory and re-read from the table every `sync_interval`
+    seconds to pick up created, deleted and edited alerts. The re-read runs in a
+    background thread while ticks keep being evaluated against the current book, and
+    the new book is swapped in when it is ready. Each tick only touches the alerts of its
+    own symbol, found by bisect.
+
+    Args:
+        tick_source (iterable): (symbol, price) ticks, e.g. from file_tick_source or socket_tick_source.
+        sync_interval (float): Seconds between table syncs.
+    """
+    book = load_alert_book()
+    last_sync = time.monotonic()
+    print(f"Loaded {len(book)} active alerts")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        reload = None
+        # Alerts triggered while a reload runs may still be active in its snapshot
+        triggered_during_reload = set()
+
+        for symbol, price in tick_source:
+            if reload is None and time.monotonic() - last_sync >= sync_interval:
+                reload = executor.submit(load_alert_book)
+                triggered_during_reload = set()
+            elif reload is not None and reload.done():
+                try:
+                    new_book = reload.result()
+                except Exception as e:
+                    print(f"Error syncing alerts, keeping the current book: {e}")
+                else:
+                    for alert_id in triggered_during_reload:
+                        new_book.remove(alert_id)
+                    book = new_book
+                    print(f"Synced {len(book)} active alerts")
+                reload = None
+                last_sync = time.monotonic()
+
+            triggered = [(alert, price) for alert in book.pop_crossed(symbol, price)]
+            if triggered:
+                if reload is not None:
+                    triggered_during_reload.update(alert["alert_id"] for alert, _ in triggered)
+                dispatch_triggered_alerts(triggered)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trigger stock alerts from a stream of price ticks.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Replay ticks from a file ('SYMBOL,PRICE' or JSON lines).")
+    source.add_argument("--socket", help="Read ticks from a TCP socket, as HOST:PORT.")
+    parser.add_argument("--follow", action="store_true", help="Keep reading ticks appended to --file.")
+    parser.add_argument("--sync-interval", type=float, default=SYNC_INTERVAL,
+                        help="Seconds between re-reads of the active alerts.")
+    args = parser.parse_args()
+
+    if args.file:
+        ticks = file_tick_source(args.file, follow=args.follow)
+    else:
+        host, port = args.socket.rsplit(":", 1)
+        ticks = socket_tick_source(host, int(port))
+    run_stream(ticks, sync_interval=args.sync_interval)
@@ -1,84 +1,336 @@
+import os
+import json
+import queue
+import random
+import threading
 import boto3
-import yfinance as yf
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 import time
+from price_history import get_latest_prices
+from alert_book import AlertBook
 
-dynamodb = boto3.resource("dynamodb")
-ses = boto3.client("ses")
+# Point at a local DynamoDB stand-in (e.g. http://localhost:8000) for testing
+DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL")
+# Number of parallel scan segments over the alerts table
+ALERT_SCAN_SEGMENTS = int(os.environ.get("ALERT_SCAN_SEGMENTS", "4"))
+# Optional GSI partitioned on status; when set, active alerts are queried instead of scanned
+ALERT_STATUS_INDEX = os.environ.get("ALERT_STATUS_INDEX")
+# Concurrent SES bulk sends when dispatching triggered alerts
+NOTIFICATION_WORKERS = int(os.environ.get("NOTIFICATION_WORKERS", "8"))
+# SES template used for bulk alert emails (created on first use)
+ALERT_EMAIL_TEMPLATE = os.environ.get("ALERT_EMAIL_TEMPLATE", "StockAlertTriggered")
+SENDER_EMAIL = "noreply@yourdomain.com"  # Replace with a verified SES email
+SES_BULK_LIMIT = 50  # Destinations per SendBulkTemplatedEmail call
+MAX_THROTTLE_RETRIES = 5
+THROTTLING_ERRORS = {
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+}
+
+# Adaptive client-side rate limiting on top of our own backoff
+aws_config = Config(retries={"max_attempts": 10, "mode": "adaptive"})
+dynamodb = boto3.resource("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL, config=aws_config)
+ses = boto3.client("ses", config=aws_config)
 table_name = "StockAlertsTable"  # Replace with your table name
 table = dynamodb.Table(table_name)
 
-def fetch_price(stock_symbol):
+ACTIVE_ALERT_FILTER = {
+    "ExpressionAttributeNames": {"#status": "status"},
+    "ExpressionAttributeValues": {":active": "active"},
+}
+
+def fetch_prices(stock_symbols):
     """
-    Fetch the current stock price using yfinance.
+    Fetch current prices for a set of stock symbols in a single batched download
+    through the shared price-history store.
+
+    Returns:
+        dict: Upper-cased symbol -> current price. Symbols without data are omitted.
     """
     try:
-        stock = yf.Ticker(stock_symbol)
-        stock_info = stock.history(period="1d", interval="1m")
-        current_price = stock_info["Close"].iloc[-1]
-        return current_price
+        prices = get_latest_prices(stock_symbols)
     except Exception as e:
-        print(f"Error fetching price for {stock_symbol}: {e}")
-        return None
+        print(f"Error fetching prices for {', '.join(stock_symbols)}: {e}")
+        return {}
+    for stock_symbol in stock_symbols:
+        if stock_symbol.upper() not in prices:
+            print(f"No price data available for {stock_symbol}")
+    return prices
+
+def fetch_price(stock_symbol):
+    """
+    Fetch the current stock price through the shared price-history store.
+    """
+    return fetch_prices([stock_symbol]).get(stock_symbol.upper())
+
+def _paginate(operation, **kwargs):
+    """
+    Yield the items of every page of a DynamoDB scan or query, following LastEvaluatedKey.
+    """
+    while True:
+        response = operation(**kwargs)
+        yield response.get("Items", [])
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+def _scan_segment(segment, total_segments, pages):
+    """
+    Scan one segment of the alerts table, pushing each page of active alerts onto `pages`.
+    """
+    try:
+        # boto3 resources are not thread-safe, so every segment gets its own
+        segment_table = boto3.session.Session().resource(
+            "dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL, config=aws_config
+        ).Table(table_name)
+        for items in _paginate(
+            segment_table.scan,
+            FilterExpression="#status = :active",
+            Segment=segment,
+            TotalSegments=total_segments,
+            **ACTIVE_ALERT_FILTER,
+        ):
+            if items:
+                pages.put(items)
+    finally:
+        pages.put(None)
+
+def iter_active_alert_pages(total_segments=ALERT_SCAN_SEGMENTS):
+    """
+    Yield pages of active alerts as they arrive.
+
+    Reads the whole table with parallel segmented scans (or queries ALERT_STATUS_INDEX
+    when configured), following pagination to the end.
+    """
+    if ALERT_STATUS_INDEX:
+        for items in _paginate(
+            table.query,
+            IndexName=ALERT_STATUS_INDEX,
+            KeyConditionExpression="#status = :active",
+            **ACTIVE_ALERT_FILTER,
+        ):
+            if items:
+                yield items
+        return
+
+    pages = queue.Queue()
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        segments = [
+            executor.submit(_scan_segment, segment, total_segments, pages)
+            for segment in range(total_segments)
+        ]
+        running = total_segments
+        while running:
+            items = pages.get()
+            if items is None:
+                running -= 1
+            else:
+                yield items
+        # Surface any segment failure
+        for segment in segments:
+            segment.result()
+
+def price_new_symbols(alerts, prices):
+    """
+    Fetch, in one batched download, prices for symbols in `alerts` not priced yet in this run.
+
+    Args:
+        alerts (list): Alert items.
+        prices (dict): Upper-cased symbol -> current price, updated in place. Symbols without
+            data are recorded as None so they are not refetched.
+    """
+    unpriced = list({alert["stock_symbol"].upper() for alert in alerts} - set(prices))
+    if unpriced:
+        fetched = fetch_prices(unpriced)
+        prices.update({stock_symbol: fetched.get(stock_symbol) for stock_symbol in unpriced})
+
+def with_backoff(operation, *args, **kwargs):
+    """
+    Call an AWS operation, retrying with exponential backoff and jitter while it is throttled.
+    """
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        try:
+            return operation(*args, **kwargs)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in THROTTLING_ERRORS or attempt == MAX_THROTTLE_RETRIES:
+                raise
+            time.sleep(min(0.1 * 2 ** attempt, 5) * (0.5 + random.random()))
+
+_email_template_ready = False
+_email_template_lock = threading.Lock()
+
+def ensure_email_template():
+    """
+    Create the SES template used for bulk alert emails if it does not exist yet.
+    Runs the SES call at most once per process.
+    """
+    global _email_template_ready
+    with _email_template_lock:
+        if _email_template_ready:
+            return
+        _create_email_template()
+        _email_template_ready = True
+
+def _create_email_template():
+    try:
+        ses.create_template(
+            Template={
+                "TemplateName": ALERT_EMAIL_TEMPLATE,
+                "SubjectPart": "Stock Alert Triggered: {{stock_symbol}}",
+                "TextPart": (
+                    "Hello,\n\n"
+                    "The stock {{stock_symbol}} has reached your threshold.\n"
+                    "Current Price: ${{current_price}}\n"
+                    "Threshold: ${{price_point}}\n\n"
+                    "Regards,\nYour Stock Alert App"
+                ),
+            }
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "AlreadyExists":
+            raise
+
+def send_bulk_email_alerts(triggered):
+    """
+    Send one templated SES bulk email for up to SES_BULK_LIMIT triggered alerts.
+
+    Args:
+        triggered (list): (alert, current_price) pairs.
+    """
+    destinations = [
+        {
+            "Destination": {"ToAddresses": [alert["user_email"]]},
+            "ReplacementTemplateData": json.dumps({
+                "stock_symbol": alert["stock_symbol"],
+                "current_price": f"{current_price:.2f}",
+                "price_point": f"{alert['price_point']:.2f}",
+            }),
+        }
+        for alert, current_price in triggered
+    ]
+    try:
+        response = with_backoff(
+            ses.send_bulk_templated_email,
+            Source=SENDER_EMAIL,
+            Template=ALERT_EMAIL_TEMPLATE,
+            DefaultTemplateData=json.dumps({"stock_symbol": "", "current_price": "", "price_point": ""}),
+            Destinations=destinations,
+        )
+    except ClientError as e:
+        print(f"Error sending bulk email: {e}")
+        return
+
+    for (alert, _), status in zip(triggered, response.get("Status", [])):
+        if status.get("Status", "Success") == "Success":
+            print(f"Email sent to {alert['user_email']} for {alert['stock_symbol']}.")
+        else:
+            print(f"Error sending email to {alert['user_email']}: {status.get('Error')}")
+
+def notify_triggered_alerts(triggered):
+    """
+    Dispatch notifications for all triggered alerts through a bounded worker pool of bulk sends.
 
-def send_email_alert(alert, current_price):
+    Args:
+        triggered (list): (alert, current_price) pairs.
     """
-    Sends an email alert via Amazon SES.
+    if not triggered:
+        return
+    ensure_email_template()
+    chunks = [triggered[i:i + SES_BULK_LIMIT] for i in range(0, len(triggered), SES_BULK_LIMIT)]
+    with ThreadPoolExecutor(max_workers=NOTIFICATION_WORKERS) as executor:
+        list(executor.map(send_bulk_email_alerts, chunks))
+
+def _mark_alert_triggered(alert):
     """
-    subject = f"Stock Alert Triggered: {alert['stock_symbol']}"
-    body = (
-        f"Hello,\n\n"
-        f"The stock {alert['stock_symbol']} has reached your threshold.\n"
-        f"Current Price: ${current_price:.2f}\n"
-        f"Threshold: ${alert['price_point']:.2f}\n\n"
-        f"Regards,\nYour Stock Alert App"
-    )
+    Set one alert's status to 'triggered' if it is still active.
 
+    Returns:
+        bool: True if this call changed the status.
+    """
     try:
-        ses.send_email(
-            Source="noreply@yourdomain.com",  # Replace with a verified SES email
-            Destination={"ToAddresses": [alert["user_email"]]},
-            Message={
-                "Subject": {"Data": subject},
-                "Body": {"Text": {"Data": body}},
-            },
+        with_backoff(
+            dynamodb.meta.client.update_item,  # The low-level client is thread-safe
+            TableName=table_name,
+            Key={"alert_id": alert["alert_id"]},
+            UpdateExpression="SET #status = :triggered",
+            ConditionExpression="#status = :active",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":triggered": "triggered", ":active": "active"},
         )
-        print(f"Email sent to {alert['user_email']} for {alert['stock_symbol']}.")
+        return True
     except ClientError as e:
-        print(f"Error sending email: {e}")
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            # Deleted, re-created or already triggered since it was read
+            return False
+        print(f"Error marking alert {alert['alert_id']} as triggered: {e}")
+        return False
+
+def mark_alerts_triggered(alerts):
+    """
+    Set the status of many alerts to 'triggered' with targeted conditional updates on a
+    worker pool. Only the status is written, and only while the alert is still active,
+    so changes made to the table after the alerts were read are kept.
+
+    Returns:
+        list: The alerts whose status this call changed.
+    """
+    if not alerts:
+        return []
+    with ThreadPoolExecutor(max_workers=NOTIFICATION_WORKERS) as executor:
+        marked = list(executor.map(_mark_alert_triggered, alerts))
+    return [alert for alert, changed in zip(alerts, marked) if changed]
+
+def evaluate_alerts(book, prices, symbols=None):
+    """
+    Collect every alert in the book crossed by the current prices, one bisect per symbol
+    and direction. Triggered alerts are removed from the book.
+
+    Args:
+        book (AlertBook): Active alerts.
+        prices (dict): Upper-cased symbol -> current price.
+        symbols (iterable, optional): Only evaluate these symbols (default: all in the book).
+
+    Returns:
+        list: (alert, current_price) pairs for the triggered alerts.
+    """
+    triggered = []
+    for stock_symbol in (book.symbols() if symbols is None else symbols):
+        current_price = prices.get(stock_symbol)
+        if current_price is None:
+            continue
+        triggered += [(alert, current_price) for alert in book.pop_crossed(stock_symbol, current_price)]
+    return triggered
+
+def dispatch_triggered_alerts(triggered):
+    """
+    Mark triggered alerts as triggered and notify the users of those that were still
+    active, so alerts deleted or already handled elsewhere are not sent twice.
+    """
+    marked = {alert["alert_id"] for alert in mark_alerts_triggered([alert for alert, _ in triggered])}
+    notify_triggered_alerts([(alert, price) for alert, price in triggered if alert["alert_id"] in marked])
 
 def process_alerts():
     """
     Processes active alerts in the table and sends notifications if criteria are met.
     """
     try:
-        response = table.scan(
-            FilterExpression="status = :active",
-            ExpressionAttributeValues={":active": "active"}
-        )
-        alerts = response.get("Items", [])
-
-        for alert in alerts:
-            stock_symbol = alert["stock_symbol"]
-            price_point = Decimal(alert["price_point"])
-            comparison_mode = alert["comparison_mode"]
-
-            current_price = fetch_price(stock_symbol)
-            if current_price is None:
-                continue
-
-            # Check if alert criteria are met
-            if (comparison_mode == ">" and current_price >= price_point) or \
-               (comparison_mode == "<" and current_price <= price_point):
-                send_email_alert(alert, current_price)
-                # Update alert status to 'triggered'
-                table.update_item(
-                    Key={"alert_id": alert["alert_id"]},
-                    UpdateExpression="SET #status = :triggered",
-                    ExpressionAttributeNames={"#status": "status"},
-                    ExpressionAttributeValues={":triggered": "triggered"}
-                )
+        book = AlertBook()
+        prices = {}
+        # Each page is priced and evaluated as it arrives, while later pages are still
+        # scanning, so a run cut short still dispatches the alerts it got through
+        for alerts in iter_active_alert_pages():
+            book.add_many(alerts)
+            price_new_symbols(alerts, prices)
+            page_symbols = {alert["stock_symbol"].upper() for alert in alerts}
+            triggered = evaluate_alerts(book, prices, page_symbols)
+            if triggered:
+                dispatch_triggered_alerts(triggered)
     except Exception as e:
         print(f"Error processing alerts: {e}")
 
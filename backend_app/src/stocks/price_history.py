@@ -0,0 +1,353 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yfinance as yf
+
+logger = logging.getLogger(__name__)
+
+# Local columnar store of daily OHLCV bars, one Parquet file per ticker.
+# /tmp is the only writable path inside Lambda and survives warm invocations.
+STORE_DIR = os.environ.get("PRICE_HISTORY_DIR", "/tmp/price_history")
+
+# Seconds after which the most recent (possibly still forming) bar is refetched
+REFRESH_INTERVAL = 900
+
+# Stand-in start date for period="max"
+EARLIEST_DATE = pd.Timestamp("1950-01-01")
+
+# Refreshes also refetch this many days before the last cached bar. Bars are split- and
+# dividend-adjusted, so a corporate action rebases all history; when the refetched complete
+# bars disagree with the cache by more than REBASE_TOLERANCE, the whole range is re-downloaded.
+REBASE_OVERLAP = pd.Timedelta(days=7)
+REBASE_TOLERANCE = 1e-4
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+_METADATA_KEY = b"price_history"
+_update_listeners = []
+
+# One lock per ticker, so threads never download or rewrite the same ticker concurrently
+_ticker_locks = {}
+_ticker_locks_guard = threading.Lock()
+
+def _ticker_lock(ticker):
+    with _ticker_locks_guard:
+        return _ticker_locks.setdefault(ticker, threading.Lock())
+
+def add_update_listener(callback):
+    """
+    Register `callback(tickers)`, called with the upper-cased tickers whose stored bars
+    changed after a fetch (e.g. to invalidate results derived from them).
+    """
+    _update_listeners.append(callback)
+
+def _notify_updated(tickers):
+    for callback in _update_listeners:
+        try:
+            callback(tickers)
+        except Exception as e:
+            logger.warning(f"Price history update listener failed: {e}")
+
+def _cache_path(ticker):
+    return os.path.join(STORE_DIR, f"{ticker}.parquet")
+
+def period_start(period, end):
+    """
+    Convert a yfinance-style period string into the first date it covers.
+
+    Args:
+        period (str): Period such as '5d', '1mo', '1y', 'ytd' or 'max'.
+        end (pd.Timestamp): Last date of the period.
+
+    Returns:
+        pd.Timestamp: First date of the period.
+    """
+    if period == "max":
+        return EARLIEST_DATE
+    if period == "ytd":
+        return end.replace(month=1, day=1)
+
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not match:
+        raise ValueError(f"Invalid period: {period}")
+    count, unit = int(match.group(1)), match.group(2)
+    offset = {
+        "d": pd.DateOffset(days=count),
+        "wk": pd.DateOffset(weeks=count),
+        "mo": pd.DateOffset(months=count),
+        "y": pd.DateOffset(years=count),
+    }[unit]
+    return end - offset
+
+def _read_cache(ticker):
+    """
+    Read a ticker's cached bars and coverage metadata, or (None, None) if not cached.
+    """
+    path = _cache_path(ticker)
+    if not os.path.exists(path):
+        return None, None
+    try:
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[_METADATA_KEY])
+        return table.to_pandas(), meta
+    except Exception as e:
+        logger.warning(f"Discarding unreadable price history for {ticker}: {e}")
+        return None, None
+
+def _write_cache(ticker, df, meta):
+    """
+    Atomically write a ticker's bars and coverage metadata.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(df)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_METADATA_KEY] = json.dumps(meta).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, _cache_path(ticker))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _missing_ranges(meta, start, end, max_age):
+    """
+    Work out which date ranges of [start, end] are not covered by the cache.
+    """
+    if meta is None:
+        return [(start, end)]
+
+    covered_start = pd.Timestamp(meta["covered_start"])
+    covered_end = pd.Timestamp(meta["covered_end"])
+    ranges = []
+    if start < covered_start:
+        ranges.append((start, covered_start - pd.Timedelta(days=1)))
+    # The last covered bar may have been fetched intraday, so refetch it along with anything newer
+    if end > covered_end or (end == covered_end and time.time() - meta["fetched_at"] > max_age):
+        ranges.append((max(covered_end - REBASE_OVERLAP, covered_start), end))
+    return ranges
+
+def _normalize_bars(df):
+    """
+    Keep the OHLCV columns of a download, indexed by tz-naive dates.
+    """
+    df = df.reindex(columns=PRICE_COLUMNS).dropna(subset=["Close"])
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize()
+    df.index.name = "Date"
+    return df.astype(float)
+
+def _rebased(cached, bars):
+    """
+    Whether freshly downloaded bars disagree with the cached complete bars they overlap,
+    i.e. the adjusted history was rebased by a split or dividend since it was cached.
+    The last cached bar may have been fetched intraday and is not compared.
+    """
+    if cached is None or len(cached) < 2:
+        return False
+    complete = cached["Close"].iloc[:-1]
+    overlap = complete.index.intersection(bars.index)
+    if overlap.empty:
+        return False
+    old, new = complete.loc[overlap], bars.loc[overlap, "Close"]
+    return bool(((new - old).abs() > REBASE_TOLERANCE * old.abs()).any())
+
+def _download(tickers, start, end):
+    """
+    Download daily bars for several tickers over the same date range in one request.
+
+    Returns:
+        dict: Ticker -> DataFrame of bars (tickers without data are omitted).
+    """
+    data = yf.download(
+        tickers,
+        start=start.strftime("%Y-%m-%d"),
+        end=(end + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),  # yfinance's end is exclusive
+        group_by="ticker",
+        auto_adjust=True,
+        progress=False,
+    )
+    if data is None or data.empty:
+        return {}
+
+    bars = {}
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex):
+            if ticker not in data.columns.get_level_values(0):
+                continue
+            frame = data[ticker]
+        else:
+            frame = data
+        frame = _normalize_bars(frame)
+        if not frame.empty:
+            bars[ticker] = frame
+    return bars
+
+def get_price_history(tickers, period="1y", end=None, max_age=REFRESH_INTERVAL):
+    """
+    Read daily bars for several tickers through the local store.
+
+    Only date ranges missing from the store are fetched upstream, and tickers that miss
+    the same range are fetched together in a single multi-ticker download.
+
+    Args:
+        tickers (list): Stock ticker symbols.
+        period (str): yfinance-style period ending at `end`, e.g. '1y'.
+        end (str or datetime, optional): Last date to include (default today).
+        max_age (float): Seconds before the latest cached bar is considered stale.
+
+    Returns:
+        dict: Upper-cased ticker -> DataFrame of OHLCV bars indexed by date.
+            Tickers with no data are omitted.
+    """
+    end = pd.Timestamp(end or pd.Timestamp.now()).normalize()
+    start = period_start(period, end)
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+
+    # Locks are taken in sorted order, so overlapping requests cannot deadlock. A caller
+    # waiting on a ticker another thread is downloading then reads the fresh bars.
+    with ExitStack() as stack:
+        for ticker in sorted(tickers):
+            stack.enter_context(_ticker_lock(ticker))
+        history, updated = _read_through(tickers, start, end, max_age)
+
+    if updated:
+        _notify_updated(updated)
+    return history
+
+def _read_through(tickers, start, end, max_age):
+    """
+    Serve [start, end] for each ticker from the store, downloading missing ranges.
+    Callers must hold the tickers' locks.
+
+    Returns:
+        tuple: (ticker -> bars within the window, tickers whose stored bars changed)
+    """
+    cached = {}
+    pending = {}
+    for ticker in tickers:
+        df, meta = _read_cache(ticker)
+        cached[ticker] = (df, meta)
+        for missing in _missing_ranges(meta, start, end, max_age):
+            pending.setdefault(missing, []).append(ticker)
+
+    fetched = {}
+    for (range_start, range_end), range_tickers in pending.items():
+        try:
+            bars = _download(range_tickers, range_start, range_end)
+        except Exception as e:
+            logger.error(f"Error downloading {range_tickers} for {range_start:%Y-%m-%d}..{range_end:%Y-%m-%d}: {e}")
+            continue
+        # A range only counts as covered for tickers it returned bars for; yfinance returns
+        # nothing rather than raising when rate-limited, and those ranges are retried
+        for ticker in range_tickers:
+            if ticker in bars:
+                fetched.setdefault(ticker, []).append((range_start, range_end, bars[ticker]))
+
+    history = {}
+    updated = []
+    for ticker in tickers:
+        df, meta = cached[ticker]
+        if ticker in fetched:
+            previous = df
+            frames = [df] if df is not None else []
+            covered_start = pd.Timestamp(meta["covered_start"]) if meta else None
+            covered_end = pd.Timestamp(meta["covered_end"]) if meta else None
+            fetched_at = meta["fetched_at"] if meta else 0
+            for range_start, range_end, bars in fetched[ticker]:
+                frames.append(bars)
+                covered_start = range_start if covered_start is None else min(covered_start, range_start)
+                covered_end = range_end if covered_end is None else max(covered_end, range_end)
+                if range_end >= covered_end:
+                    fetched_at = time.time()
+
+            if any(_rebased(previous, bars) for _, _, bars in fetched[ticker]):
+                # Cached bars are on the old adjustment basis: replace the whole covered range
+                logger.info(f"Adjusted history of {ticker} was rebased, re-downloading it")
+                try:
+                    rebased = _download([ticker], covered_start, covered_end).get(ticker)
+                except Exception as e:
+                    logger.error(f"Error re-downloading {ticker} after a rebase: {e}")
+                    rebased = None
+                # Without it, keep the cached bars on their consistent old basis and retry next call
+                frames = [rebased] if rebased is not None else None
+
+            if frames is not None:
+                df = pd.concat(frames)
+                df = df[~df.index.duplicated(keep="last")].sort_index()
+                if previous is None or not df.equals(previous):
+                    updated.append(ticker)
+                meta = {
+                    "covered_start": covered_start.strftime("%Y-%m-%d"),
+                    "covered_end": covered_end.strftime("%Y-%m-%d"),
+                    "fetched_at": fetched_at,
+                }
+                try:
+                    _write_cache(ticker, df, meta)
+                except Exception as e:
+                    logger.warning(f"Could not persist price history for {ticker}: {e}")
+
+        if df is not None:
+            window = df.loc[start:end].copy()
+            if not window.empty:
+                history[ticker] = window
+    return history, updated
+
+def get_close_panel(tickers, period="1y", end=None, max_age=REFRESH_INTERVAL):
+    """
+    Read a date-by-ticker panel of closing prices through the local store.
+
+    Args:
+        tickers (list): Stock ticker symbols.
+        period (str): yfinance-style period, e.g. '1y'.
+        end (str or datetime, optional): Last date to include (default today).
+        max_age (float): Seconds before the latest cached bar is considered stale.
+
+    Returns:
+        pd.DataFrame: Closing prices with one upper-cased column per ticker that has data.
+    """
+    history = get_price_history(tickers, period, end, max_age)
+    if not history:
+        return pd.DataFrame()
+    return pd.DataFrame({ticker: bars["Close"] for ticker, bars in history.items()}).sort_index()
+
+def get_latest_prices(tickers, max_age=60):
+    """
+    Get the most recent closing price of several tickers through the local store,
+    refreshing any stale ones with a single multi-ticker download.
+
+    Args:
+        tickers (list): Stock ticker symbols.
+        max_age (float): Seconds before a cached latest bar is refetched.
+
+    Returns:
+        dict: Upper-cased ticker -> latest price. Tickers with no data are omitted.
+    """
+    history = get_price_history(tickers, period="5d", max_age=max_age)
+    return {ticker: float(bars["Close"].iloc[-1]) for ticker, bars in history.items()}
+
+def get_latest_price(ticker, max_age=60):
+    """
+    Get the most recent closing price of a ticker through the local store.
+
+    Args:
+        ticker (str): Stock ticker symbol.
+        max_age (float): Seconds before the cached latest bar is refetched.
+
+    Returns:
+        float or None: Latest price, or None if no data is available.
+    """
+    return get_latest_prices([ticker], max_age=max_age).get(ticker.upper())
@@ -1,63 +1,167 @@
-import yfinance as yf
 import numpy as np
 import pandas as pd
 import logging
-import fetch_volatility as fv
+import threading
+import time
+from collections import OrderedDict
+from price_history import get_close_panel, REFRESH_INTERVAL
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def calculate_correlation(tickers, period="1y"):
+# Return statistics per (sorted ticker set, period), reused across warm invocations.
+# Least recently used entries are evicted beyond STATISTICS_CACHE_SIZE.
+_statistics_cache = OrderedDict()
+_statistics_cache_lock = threading.Lock()
+STATISTICS_CACHE_TTL = REFRESH_INTERVAL
+STATISTICS_CACHE_SIZE = 32
+
+def calculate_return_statistics(stock_data):
     """
-    Calculate the correlation coefficient between a list of stock tickers over a specified period.
+    Derive every per-stock and cross-stock statistic from a single price panel.
 
     Args:
-    tickers (list): A list of stock tickers (e.g., ['AAPL', 'GOOGL', 'AMZN']).
-    period (str): The period to retrieve the data for, default is "1y" (1 year).
+    stock_data (pd.DataFrame): Closing prices, one column per ticker.
 
     Returns:
-    pd.DataFrame: A correlation matrix of stock returns.
+    dict: Daily returns, annualized mean returns, annualized volatilities,
+          correlation matrix and annualized covariance matrix.
     """
-    # Fetch historical data for the given tickers
-    stock_data = yf.download(tickers, period=period)['Close']
-    
-    # Ensure that the data is not empty
+    # Calculate daily returns for each stock
+    daily_returns = stock_data.pct_change().dropna()
+
+    # Annualized volatility from each stock's own log-return history (252 trading days)
+    log_returns = np.log(stock_data / stock_data.shift(1))
+    annual_volatilities = log_returns.std() * np.sqrt(252)
+
+    return {
+        'daily_returns': daily_returns,
+        'annual_returns': daily_returns.mean() * 252,
+        'annual_volatilities': annual_volatilities,
+        'correlation_matrix': daily_returns.corr(),
+        'covariance_matrix': daily_returns.cov() * 252,  # Annualized covariance
+    }
+
+def normalize_tickers(tickers):
+    """
+    Canonical form of a ticker set: stripped, upper-cased, de-duplicated and sorted,
+    so equal holdings always map to the same market-data key.
+    """
+    return tuple(sorted({ticker.strip().upper() for ticker in tickers}))
+
+def normalize_portfolio(portfolio_tuples):
+    """
+    Canonical form of portfolio holdings: tickers stripped and upper-cased, and repeated
+    tickers merged into one holding (shares summed, price weighted by value).
+
+    Args:
+    portfolio_tuples (list): List of tuples with (stock_ticker, number_of_shares, current_price)
+
+    Returns:
+    list: (TICKER, number_of_shares, current_price) tuples in first-seen order.
+    """
+    holdings = {}
+    for ticker, shares, price in portfolio_tuples:
+        ticker = ticker.strip().upper()
+        held_shares, held_value = holdings.get(ticker, (0, 0))
+        holdings[ticker] = (held_shares + shares, held_value + shares * price)
+    return [
+        (ticker, shares, value / shares if shares else 0)
+        for ticker, (shares, value) in holdings.items()
+    ]
+
+def get_return_statistics(tickers, period="1y", use_cache=True):
+    """
+    Get return statistics for a set of tickers, computing them at most once per
+    (ticker set, period) within STATISTICS_CACHE_TTL seconds.
+
+    Args:
+    tickers (list): A list of stock tickers.
+    period (str): The period to retrieve the data for.
+    use_cache (bool): Whether to use the in-process statistics cache. Callers that cache
+        the result themselves pass False, so a forced recompute really recomputes.
+
+    Returns:
+    dict: Statistics as returned by calculate_return_statistics, with columns in sorted ticker order.
+    """
+    key = (normalize_tickers(tickers), period)
+    if use_cache:
+        with _statistics_cache_lock:
+            cached = _statistics_cache.get(key)
+            if cached is not None and time.time() - cached[0] < STATISTICS_CACHE_TTL:
+                _statistics_cache.move_to_end(key)
+                return cached[1]
+
+    stock_data = get_close_panel(list(key[0]), period=period)
     if stock_data.empty:
         raise ValueError(f"Could not retrieve data for {', '.join(tickers)}")
 
-    # Calculate daily returns for each stock
-    daily_returns = stock_data.pct_change().dropna()
+    statistics = calculate_return_statistics(stock_data)
+    if use_cache:
+        with _statistics_cache_lock:
+            _statistics_cache[key] = (time.time(), statistics)
+            _statistics_cache.move_to_end(key)
+            while len(_statistics_cache) > STATISTICS_CACHE_SIZE:
+                _statistics_cache.popitem(last=False)
+    return statistics
 
-    # Calculate the correlation matrix for the daily returns
-    correlation_matrix = daily_returns.corr()
+def calculate_correlation(tickers, period="1y", statistics=None):
+    """
+    Calculate the correlation coefficient between a list of stock tickers over a specified period.
 
-    return correlation_matrix
+    Args:
+    tickers (list): A list of stock tickers (e.g., ['AAPL', 'GOOGL', 'AMZN']).
+    period (str): The period to retrieve the data for, default is "1y" (1 year).
+    statistics (dict, optional): Precomputed return statistics covering the tickers.
 
-def calculate_portfolio_variance(portfolio_weights, annual_volatilities, correlation_matrix):
+    Returns:
+    pd.DataFrame: A correlation matrix of stock returns.
     """
-    Calculate the variance of a portfolio given the weights, volatilities, and correlation matrix.
+    statistics = statistics or get_return_statistics(tickers, period)
+    correlation_matrix = statistics['correlation_matrix']
+
+    # Keep the caller's ticker order
+    ordered = [ticker for ticker in dict.fromkeys(t.strip().upper() for t in tickers) if ticker in correlation_matrix.columns]
+    return correlation_matrix.loc[ordered, ordered]
+
+def calculate_portfolio_risk(weight_matrix, covariance_matrix):
+    """
+    Calculate the volatility of many portfolios over the same covariance matrix at once.
 
     Args:
-    portfolio_weights (numpy.array): Array of weights of the stocks in the portfolio.
-    annual_volatilities (numpy.array): Array of annual volatilities (standard deviations) of the stocks.
-    correlation_matrix (pandas.DataFrame): Correlation matrix of stock returns.
+    weight_matrix (array-like): Weights with shape (n_portfolios, n_stocks), or a single weight vector.
+    covariance_matrix (array-like): Annualized covariance matrix (n_stocks x n_stocks).
 
     Returns:
-    float: Portfolio variance.
+    numpy.array: Portfolio volatilities, the square root of the diagonal of W * covariance * W^T.
+    """
+    weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype=float))
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+
+    # Row-wise w * covariance * w^T without forming the full n_portfolios x n_portfolios product
+    portfolio_variances = np.einsum('ij,jk,ik->i', weight_matrix, covariance_matrix, weight_matrix)
+    return np.sqrt(portfolio_variances)
+
+def evaluate_portfolio_risk(tickers, weight_matrix, period="1y"):
     """
+    Evaluate the volatility of many candidate weightings of the same stock universe.
 
-    portfolio_weights = np.array(portfolio_weights)
-    annual_volatilities = np.array(annual_volatilities)
-    correlation_matrix = np.array(correlation_matrix)
-    # Convert correlation matrix to a covariance matrix
-    # Calculate the covariance matrix using the volatilities and correlation matrix
-    cov_matrix = correlation_matrix * np.outer(annual_volatilities, annual_volatilities)
+    Args:
+    tickers (list): Stock tickers, in the column order of weight_matrix.
+    weight_matrix (array-like): Weights with shape (n_portfolios, len(tickers)).
+    period (str): The period to retrieve the data for.
 
-    # Calculate portfolio variance using the formula: w^T * covariance_matrix * w
-    portfolio_variance = np.dot(portfolio_weights.T, np.dot(cov_matrix, portfolio_weights))
+    Returns:
+    numpy.array: Annualized volatility of each weighting.
+    """
+    tickers = [ticker.upper() for ticker in tickers]
+    covariance_matrix = get_return_statistics(tickers, period)['covariance_matrix']
 
-    return np.sqrt(portfolio_variance)
+    missing = [ticker for ticker in tickers if ticker not in covariance_matrix.columns]
+    if missing:
+        raise ValueError(f"No data available for {', '.join(missing)}")
 
+    return calculate_portfolio_risk(weight_matrix, covariance_matrix.loc[tickers, tickers])
 
 def calculate_portfolio_metrics(portfolio_tuples, period, risk_free_rate=0.05):
     """
@@ -73,33 +177,47 @@ def calculate_portfolio_metrics(portfolio_tuples, period, risk_free_rate=0.05):
     # Validate input
     if not portfolio_tuples:
         raise ValueError("Portfolio cannot be empty")
-    
-    # Prepare data structures
+
+    portfolio_tuples = normalize_portfolio(portfolio_tuples)
     stock_tickers = [ticker for ticker, _, _ in portfolio_tuples]
     
-    # Calculate total portfolio value
-    total_portfolio_value = sum([shares * price for _, shares, price in portfolio_tuples])
-    
-    # Download historical stock data
+    # Download historical stock data and derive every statistic from it
     try:
-        stock_data = yf.download(stock_tickers, period=period)['Close']
+        statistics = get_return_statistics(stock_tickers, period=period)
         logger.info(f"Successfully downloaded data for {stock_tickers}")
     except Exception as e:
         logger.error(f"Error downloading stock data: {e}")
         raise ValueError(f"Error downloading stock data: {e}")
+
+    return weight_portfolio(portfolio_tuples, statistics, risk_free_rate)
+
+def weight_portfolio(portfolio_tuples, statistics, risk_free_rate=0.05):
+    """
+    Calculate portfolio risk and expected return from precomputed return statistics.
+
+    This is the cheap, per-request part of calculate_portfolio_metrics: the statistics
+    depend only on the ticker set and period, so holdings that differ only in share
+    counts or prices can reuse them.
+
+    Args:
+    portfolio_tuples (list): Normalized tuples with (stock_ticker, number_of_shares, current_price)
+    statistics (dict): Return statistics covering the tickers, from get_return_statistics.
+    risk_free_rate (float): Annual risk-free rate (default 5%)
+
+    Returns:
+    dict: Portfolio metrics including total risk, expected return, and individual stock details
+    """
+    stock_tickers = [ticker for ticker, _, _ in portfolio_tuples]
+
+    # Calculate total portfolio value
+    total_portfolio_value = sum([shares * price for _, shares, price in portfolio_tuples])
     
-    # Ensure data is present for all stocks
-    if stock_data.empty:
-        raise ValueError("No stock data could be retrieved. Check stock tickers.")
-    
-    # Calculate returns
-    returns = stock_data.pct_change().dropna()
+    returns = statistics['daily_returns']
     
     # Individual stock analysis
     stock_details = {}
     portfolio_weights = []
     expected_returns = []
-    annual_volatilities = []
     
     for ticker, shares, current_price in portfolio_tuples:
         # Skip if data is insufficient
@@ -108,16 +226,14 @@ def calculate_portfolio_metrics(portfolio_tuples, period, risk_free_rate=0.05):
             continue
         
         # Calculate individual stock metrics
-        stock_returns = returns[ticker]
-        avg_annual_return = stock_returns.mean() * 252  # Annualized return
-        annual_volatility = fv(ticker, period=period)
+        avg_annual_return = statistics['annual_returns'][ticker]  # Annualized return
+        annual_volatility = statistics['annual_volatilities'][ticker]
         
         # Calculate portfolio weight
         stock_value = shares * current_price
         weight = stock_value / total_portfolio_value
         portfolio_weights.append(weight)
         expected_returns.append(avg_annual_return)
-        annual_volatilities.append(annual_volatility)
         
         # Store stock details
         stock_details[ticker] = {
@@ -136,10 +252,11 @@ def calculate_portfolio_metrics(portfolio_tuples, period, risk_free_rate=0.05):
     # Portfolio expected return (weighted average of individual returns)
     portfolio_expected_return = np.dot(portfolio_weights, expected_returns)
     
-    # Portfolio variance calculation (including covariance)
-    correlation_matrix = calculate_correlation(stock_tickers,period=period)
+    # Portfolio volatility from the covariance matrix, restricted to the stocks with data
+    held_tickers = list(stock_details)
+    covariance_matrix = statistics['covariance_matrix'].loc[held_tickers, held_tickers]
 
-    portfolio_volatility = calculate_portfolio_variance(portfolio_weights, annual_volatilities, correlation_matrix)
+    portfolio_volatility = calculate_portfolio_risk(portfolio_weights, covariance_matrix)[0]
     
     # Sharpe Ratio calculation
     sharpe_ratio = (portfolio_expected_return - risk_free_rate) / portfolio_volatility
@@ -0,0 +1,221 @@
+import numpy as np
+import logging
+from lambda_function import get_return_statistics
+
+logger = logging.getLogger(__name__)
+
+def project_to_capped_simplex(V, lower, upper, tau=None, tol=1e-12, max_iter=100):
+    """
+    Project each row of V onto {w : sum(w) = 1, lower <= w <= upper}.
+
+    The projection is clip(v - tau, lower, upper) with tau chosen per row so the
+    weights sum to one. tau is found for all rows at once with Newton steps on the
+    piecewise-linear weight sum, safeguarded by bisection; passing the previous tau
+    as a warm start usually makes a single step exact.
+
+    Args:
+    V (numpy.array): Matrix of shape (n_portfolios, n_stocks).
+    lower (float): Minimum weight per stock.
+    upper (float): Maximum weight per stock.
+    tau (numpy.array, optional): Initial guess of the per-row shift.
+    tol (float): Tolerance on the weight sum.
+    max_iter (int): Maximum number of Newton/bisection steps.
+
+    Returns:
+    tuple: (projected weights with the same shape as V, per-row tau).
+    """
+    n_stocks = V.shape[1]
+    tau_low = V.min(axis=1) - upper   # every weight at the upper bound: sum >= 1
+    tau_high = V.max(axis=1) - lower  # every weight at the lower bound: sum <= 1
+    excess_low = np.full(len(V), n_stocks * upper - 1)
+    excess_high = np.full(len(V), n_stocks * lower - 1)
+    tau = 0.5 * (tau_low + tau_high) if tau is None else np.clip(tau, tau_low, tau_high)
+
+    for _ in range(max_iter):
+        shifted = V - tau[:, None]
+        excess = np.clip(shifted, lower, upper).sum(axis=1) - 1
+        solved = np.abs(excess) < tol
+        if solved.all():
+            break
+        above = excess > 0
+        tau_low, excess_low = np.where(above, tau, tau_low), np.where(above, excess, excess_low)
+        tau_high, excess_high = np.where(above, tau_high, tau), np.where(above, excess_high, excess)
+
+        # The slope of the weight sum is minus the number of weights strictly inside the bounds;
+        # when a Newton step leaves the bracket, interpolate between the bracket ends instead
+        free = ((shifted > lower) & (shifted < upper)).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = tau + excess / free
+            secant = tau_low + excess_low * (tau_high - tau_low) / (excess_low - excess_high)
+        newton_ok = (free > 0) & (newton > tau_low) & (newton < tau_high)
+        secant_ok = (secant > tau_low) & (secant < tau_high)
+        step = np.where(newton_ok, newton, np.where(secant_ok, secant, 0.5 * (tau_low + tau_high)))
+        tau = np.where(solved, tau, step)
+    return np.clip(V - tau[:, None], lower, upper), tau
+
+def solve_mean_variance(expected_returns, covariance_matrix, risk_tolerances, lower=0.0, upper=1.0,
+                        tol=1e-8, max_iter=5000):
+    """
+    Solve min 0.5 * w'Cw - t * mu'w subject to sum(w) = 1 and lower <= w <= upper
+    for several risk tolerances t at once.
+
+    Uses accelerated projected gradient (FISTA) on the whole batch of portfolios, so
+    every frontier point advances with one matrix product per iteration.
+
+    Args:
+    expected_returns (numpy.array): Annualized expected returns (n_stocks).
+    covariance_matrix (numpy.array): Annualized covariance matrix (n_stocks x n_stocks).
+    risk_tolerances (array-like): Risk tolerances t; t = 0 gives the minimum-variance portfolio.
+    lower (float): Minimum weight per stock (0 for long-only).
+    upper (float): Maximum weight per stock.
+    tol (float): Stop once no weight moves by more than this between iterations.
+    max_iter (int): Maximum number of iterations.
+
+    Returns:
+    numpy.array: Optimal weights of shape (len(risk_tolerances), n_stocks).
+    """
+    mu = np.asarray(expected_returns, dtype=float)
+    C = np.asarray(covariance_matrix, dtype=float)
+    t = np.asarray(risk_tolerances, dtype=float)[:, None]
+    n_stocks = len(mu)
+    if not n_stocks * lower <= 1 <= n_stocks * upper:
+        raise ValueError("Weight bounds are infeasible: weights cannot sum to 1.")
+
+    # Step size from the Lipschitz constant of the gradient (largest eigenvalue of C)
+    step = 1.0 / max(np.linalg.eigvalsh(C)[-1], 1e-12)
+    linear_term = t * mu
+
+    W, tau = project_to_capped_simplex(np.full((len(t), n_stocks), 1.0 / n_stocks), lower, upper)
+    Y = W
+    momentum = np.ones((len(t), 1))
+    for _ in range(max_iter):
+        W_next, tau = project_to_capped_simplex(Y - step * (Y @ C - linear_term), lower, upper, tau)
+        # Adaptive restart: drop the momentum of any portfolio whose step turned against it
+        restart = np.sum((Y - W_next) * (W_next - W), axis=1, keepdims=True) > 0
+        momentum = np.where(restart, 1.0, momentum)
+        momentum_next = 0.5 * (1 + np.sqrt(1 + 4 * momentum ** 2))
+        Y = W_next + np.where(restart, 0.0, (momentum - 1) / momentum_next) * (W_next - W)
+        converged = np.max(np.abs(W_next - W)) < tol
+        W, momentum = W_next, momentum_next
+        if converged:
+            break
+    else:
+        logger.warning(f"Mean-variance solver stopped after {max_iter} iterations without converging")
+    return W
+
+def _portfolio_summary(W, mu, C, risk_free_rate):
+    """
+    Expected return, volatility and Sharpe ratio of each row of W.
+    """
+    returns = W @ mu
+    volatilities = np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', W, C, W), 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = (returns - risk_free_rate) / volatilities
+    return returns, volatilities, sharpe
+
+def efficient_frontier(expected_returns, covariance_matrix, risk_free_rate=0.05, n_points=20,
+                       long_only=True, weight_cap=1.0, refine_rounds=2):
+    """
+    Compute the minimum-variance portfolio, the maximum-Sharpe portfolio and an N-point efficient frontier.
+
+    Args:
+    expected_returns (numpy.array): Annualized expected returns (n_stocks).
+    covariance_matrix (numpy.array): Annualized covariance matrix (n_stocks x n_stocks).
+    risk_free_rate (float): Annual risk-free rate for the Sharpe ratio.
+    n_points (int): Number of frontier portfolios.
+    long_only (bool): Disallow short positions. Otherwise weights may go down to -weight_cap.
+    weight_cap (float): Maximum absolute weight per stock.
+    refine_rounds (int): Extra batched solves that zoom in around the best Sharpe ratio.
+
+    Returns:
+    dict: 'min_variance', 'max_sharpe' and 'frontier' (ordered by volatility), each holding
+          weights, expected_return, volatility and sharpe_ratio.
+    """
+    mu = np.asarray(expected_returns, dtype=float)
+    C = np.asarray(covariance_matrix, dtype=float)
+    lower, upper = (0.0 if long_only else -weight_cap), weight_cap
+
+    # Sweep risk tolerance from minimum variance (0) up to the maximum-return corner, then
+    # interpolate the tolerances that space the frontier evenly in expected return
+    scale = np.linalg.eigvalsh(C)[-1] / max(np.max(np.abs(mu)), 1e-12)
+    sweep = np.concatenate([[0.0], np.geomspace(1e-4, 1e4, 40) * scale])
+    sweep_returns = np.maximum.accumulate(solve_mean_variance(mu, C, sweep, lower, upper) @ mu)
+    sweep_returns, first = np.unique(sweep_returns, return_index=True)
+    targets = np.linspace(sweep_returns[0], sweep_returns[-1], max(n_points, 2))
+    risk_tolerances = np.interp(targets, sweep_returns, sweep[first])
+
+    W = solve_mean_variance(mu, C, risk_tolerances, lower, upper)
+    returns, volatilities, sharpe = _portfolio_summary(W, mu, C, risk_free_rate)
+
+    # Zoom in around the best Sharpe ratio with small batched solves between its neighbours
+    best = int(np.nanargmax(sharpe))
+    best_weights, best_sharpe = W[best], sharpe[best]
+    candidates, candidate_sharpe = risk_tolerances, sharpe
+    for _ in range(refine_rounds):
+        best = int(np.nanargmax(candidate_sharpe))
+        candidates = np.linspace(candidates[max(best - 1, 0)], candidates[min(best + 1, len(candidates) - 1)], 16)
+        W_refined = solve_mean_variance(mu, C, candidates, lower, upper)
+        _, _, candidate_sharpe = _portfolio_summary(W_refined, mu, C, risk_free_rate)
+        if np.nanmax(candidate_sharpe) > best_sharpe:
+            best_weights, best_sharpe = W_refined[np.nanargmax(candidate_sharpe)], np.nanmax(candidate_sharpe)
+    best_return, best_volatility, _ = _portfolio_summary(best_weights[None, :], mu, C, risk_free_rate)
+
+    def describe(weights, expected_return, volatility, sharpe_ratio):
+        return {
+            'weights': weights,
+            'expected_return': expected_return,
+            'volatility': volatility,
+            'sharpe_ratio': sharpe_ratio,
+        }
+
+    return {
+        'min_variance': describe(W[0], returns[0], volatilities[0], sharpe[0]),
+        'max_sharpe': describe(best_weights, best_return[0], best_volatility[0], best_sharpe),
+        'frontier': [describe(W[i], returns[i], volatilities[i], sharpe[i]) for i in np.argsort(volatilities)],
+    }
+
+def optimize_portfolio(tickers, period="1y", risk_free_rate=0.05, n_points=20, long_only=True, weight_cap=1.0):
+    """
+    Suggest allocations for a stock universe from the same return statistics used by
+    calculate_portfolio_metrics.
+
+    Args:
+    tickers (list): Stock tickers in the universe.
+    period (str): The period to retrieve the data for.
+    risk_free_rate (float): Annual risk-free rate for the Sharpe ratio.
+    n_points (int): Number of frontier portfolios.
+    long_only (bool): Disallow short positions.
+    weight_cap (float): Maximum absolute weight per stock.
+
+    Returns:
+    dict: 'min_variance', 'max_sharpe' and 'frontier' portfolios with weights keyed by ticker
+          and expected return / volatility in percent, as in calculate_portfolio_metrics.
+    """
+    statistics = get_return_statistics(tickers, period)
+    universe = list(statistics['covariance_matrix'].columns)
+    if not universe:
+        raise ValueError("Unable to optimize: no stock data could be retrieved")
+
+    result = efficient_frontier(
+        statistics['annual_returns'][universe].to_numpy(),
+        statistics['covariance_matrix'].to_numpy(),
+        risk_free_rate=risk_free_rate,
+        n_points=n_points,
+        long_only=long_only,
+        weight_cap=weight_cap,
+    )
+
+    def to_report(portfolio):
+        return {
+            'weights': dict(zip(universe, portfolio['weights'].tolist())),
+            'portfolio_expected_return': portfolio['expected_return'] * 100,  # Convert to percentage
+            'portfolio_volatility': portfolio['volatility'] * 100,  # Convert to percentage
+            'sharpe_ratio': portfolio['sharpe_ratio'],
+        }
+
+    return {
+        'min_variance': to_report(result['min_variance']),
+        'max_sharpe': to_report(result['max_sharpe']),
+        'frontier': [to_report(portfolio) for portfolio in result['frontier']],
+        'individual_stocks': universe,
+    }
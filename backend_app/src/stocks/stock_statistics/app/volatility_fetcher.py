@@ -1,12 +1,13 @@
-import yfinance as yf
 import numpy as np
+from price_history import get_price_history
 
 def fetch_volatility(ticker, period="1y"):
     """
-    Fetch volatility (standard deviation of returns) for a stock using yfinance.
+    Fetch volatility (standard deviation of returns) for a stock from the shared price-history store.
     """
-    stock = yf.Ticker(ticker)
-    df = stock.history(period=period)
+    df = get_price_history([ticker], period=period).get(ticker.upper())
+    if df is None:
+        raise ValueError(f"No price data available for {ticker} over {period}")
     df['log_return'] = np.log(df['Close'] / df['Close'].shift(1))
     volatility = df['log_return'].std() * np.sqrt(252)  # Annualized volatility (252 trading days in a year)
     return volatility
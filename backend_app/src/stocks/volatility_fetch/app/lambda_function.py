@@ -1,12 +1,104 @@
-import yfinance as yf
 import numpy as np
+import pandas as pd
+from price_history import get_close_panel, get_price_history
+
+TRADING_DAYS = 252
+DEFAULT_WINDOWS = (20, 60, 120)
+EWMA_LAMBDA = 0.94  # RiskMetrics decay for daily data
 
 def lambda_handler(ticker, period="1y"):
     """
-    Fetch volatility (standard deviation of returns) for a stock using yfinance.
+    Fetch volatility (standard deviation of returns) for a stock from the shared price-history store.
+    A list of tickers is handled in batch mode by batch_volatility.
     """
-    stock = yf.Ticker(ticker)
-    df = stock.history(period=period)
+    if isinstance(ticker, (list, tuple)):
+        return batch_volatility(ticker, period)
+    df = get_price_history([ticker], period=period).get(ticker.upper())
+    if df is None:
+        raise ValueError(f"No price data available for {ticker} over {period}")
     df['log_return'] = np.log(df['Close'] / df['Close'].shift(1))
-    volatility = df['log_return'].std() * np.sqrt(252)  # Annualized volatility (252 trading days in a year)
+    volatility = df['log_return'].std() * np.sqrt(TRADING_DAYS)  # Annualized volatility (252 trading days in a year)
     return volatility
+
+def batch_volatility(tickers, period="1y"):
+    """
+    Annualized log-return volatility for many tickers from one multi-ticker download.
+
+    Args:
+        tickers (list): Stock ticker symbols.
+        period (str): yfinance-style period, e.g. '1y'.
+
+    Returns:
+        dict: Upper-cased ticker -> annualized volatility, or None for tickers without data.
+    """
+    close = get_close_panel(tickers, period=period)
+    if close.empty:
+        volatility = pd.Series(dtype=float)
+    else:
+        # Returns run from each ticker's previous close, so calendar gaps between
+        # tickers do not drop observations
+        log_returns = np.log(close / close.ffill().shift(1))
+        volatility = log_returns.std() * np.sqrt(TRADING_DAYS)
+
+    results = {}
+    for ticker in dict.fromkeys(t.upper() for t in tickers):
+        value = volatility.get(ticker, np.nan)
+        results[ticker] = None if np.isnan(value) else float(value)
+    return results
+
+def calculate_volatility_series(df, windows=DEFAULT_WINDOWS, ewma_lambda=EWMA_LAMBDA, range_window=None):
+    """
+    Annualized volatility over time from daily OHLC bars.
+
+    Every estimator is a single rolling or recursive pass over the bars, so all windows
+    come from the same data in O(n) each.
+
+    Args:
+        df (pd.DataFrame): Daily bars with Open, High, Low and Close columns.
+        windows (tuple): Rolling windows (in trading days) for close-to-close volatility.
+        ewma_lambda (float): Decay factor of the EWMA variance.
+        range_window (int): Window for the Parkinson and Garman-Klass estimators
+            (defaults to the shortest of `windows`).
+
+    Returns:
+        pd.DataFrame: Columns rolling_<w> for each window, ewma, parkinson and
+            garman_klass, indexed by date (NaN until a window is filled).
+    """
+    range_window = range_window or min(windows)
+    log_return = np.log(df['Close'] / df['Close'].shift(1))
+    log_high_low = np.log(df['High'] / df['Low'])
+    log_close_open = np.log(df['Close'] / df['Open'])
+
+    series = {f"rolling_{window}": log_return.rolling(window).std() for window in windows}
+
+    # RiskMetrics EWMA: var_t = lambda * var_{t-1} + (1 - lambda) * r_t^2
+    series["ewma"] = np.sqrt((log_return ** 2).ewm(alpha=1 - ewma_lambda, adjust=False).mean())
+
+    # Range-based estimators use the intraday high/low, and open/close for Garman-Klass
+    series["parkinson"] = np.sqrt(
+        (log_high_low ** 2).rolling(range_window).mean() / (4 * np.log(2))
+    )
+    garman_klass_variance = 0.5 * log_high_low ** 2 - (2 * np.log(2) - 1) * log_close_open ** 2
+    series["garman_klass"] = np.sqrt(garman_klass_variance.rolling(range_window).mean().clip(lower=0))
+
+    return pd.DataFrame(series, index=df.index) * np.sqrt(TRADING_DAYS)
+
+def volatility_series_handler(ticker, period="1y", windows=DEFAULT_WINDOWS, ewma_lambda=EWMA_LAMBDA,
+                              range_window=None):
+    """
+    Fetch volatility series for a stock, for charting volatility over time in one call.
+
+    Returns:
+        dict: 'dates' (ISO strings) and 'series' mapping each estimator to a list of
+            annualized volatilities (None where the window is not yet filled).
+    """
+    df = get_price_history([ticker], period=period).get(ticker.upper())
+    if df is None:
+        raise ValueError(f"No price data available for {ticker} over {period}")
+    volatility = calculate_volatility_series(df, windows, ewma_lambda, range_window)
+    volatility = volatility.astype(object).where(volatility.notna(), None)
+    return {
+        "ticker": ticker.upper(),
+        "dates": [date.strftime("%Y-%m-%d") for date in volatility.index],
+        "series": {name: values.tolist() for name, values in volatility.items()},
+    }